@@ -1,22 +1,34 @@
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox, filedialog
 import threading
+import queue
+import argparse
+import signal
+import asyncio
+import heapq
+import atexit
+import contextlib
 import time
 import sys
 import os
 import re
 import random
 import json
+import pickle
+import math
+import socket
 import requests
 from bs4 import BeautifulSoup
 import urllib.parse as urlparse
 from urllib.robotparser import RobotFileParser
 import warnings
 import hashlib
+import email.utils
 import logging
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 import concurrent.futures
+import multiprocessing
 import shutil
 import html
 import chardet
@@ -27,8 +39,15 @@ from selenium.webdriver import ChromeOptions
 import redis
 import brotli
 from curl_cffi import requests as curl_requests
+from curl_cffi.requests import AsyncSession
 from readability import Document
-from lxml.html import fromstring
+from lxml import etree
+from lxml.html import fromstring, document_fromstring
+try:
+    # 可选：基于Lexbor的C语言HTML解析器，用于快速提取链接和图片
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
 import numpy as np
 from sklearn.ensemble import IsolationForest
 
@@ -54,6 +73,7 @@ CRAWL_SETTINGS = {
     'dynamic_rendering': False,
     'request_delay': 0.5,
     'max_depth': 1,
+    'max_pages': 0,  # 整站爬取最大页数，0为不限制
     'image_crawling': True,
     'max_threads': 5,
     'image_size_limit': 10,
@@ -67,11 +87,70 @@ CRAWL_SETTINGS = {
     'redis_password': '',
     'use_distributed': False,
     'use_bloom_filter': True,
+    'reliable_queue': False,  # 可靠队列模式：Redis Streams消费组，取出的URL带租约，确认后才删除
+    'queue_lease_timeout': 300,  # 租约超时（秒），超时未确认的URL会被其他工作者回收
+    'queue_block_timeout': 5,  # 队列为空时阻塞等待的秒数（0表示不阻塞）
+    'queue_max_deliveries': 5,  # 同一URL最多分发次数，超过后移入死信流不再分发
+    'bloom_capacity': 1000000,  # Bloom Filter初始容量（满后自动扩容）
+    'bloom_error_rate': 0.001,  # Bloom Filter目标误判率
+    'bloom_sync_batch': 500,  # 本地新增URL累计到该数量后批量同步到Redis
+    'bloom_sync_interval': 2.0,  # 本地新增URL最长同步间隔（秒）
     'behavior_simulation': True,
     'tls_fingerprint': True,
     'ai_content_extraction': True,
-    'anomaly_detection': True,
+    'content_selector_failures': 3,  # 域名缓存的正文选择器连续失败多少次后重新匹配
+    'template_learning': True,  # 按域名学习正文模板，之后的页面直接按模板提取
+    'template_min_pages': 5,  # 学习模板所需的页面数
+    'template_min_confidence': 0.8,  # 模板置信度下限，低于该值时回退到完整提取并重新学习
+    'template_file': 'content_templates.json',  # 正文模板持久化文件
+    'anomaly_detection': False,  # 需先用--train-anomaly训练模型，没有模型时不生效
+    'anomaly_model_file': 'anomaly_model.pkl',  # 预训练的异常检测模型（--train-anomaly生成）
+    'anomaly_threshold': 0.0,  # 异常分数阈值，0表示使用训练时得到的阈值
+    'anomaly_contamination': 0.01,  # 训练时视为异常的样本比例，决定默认阈值
      'image_download_threads': 20,  # 默认线程数提高到20
+    'async_fetch': False,  # 使用asyncio抓取后端
+    'async_concurrency': 200,  # asyncio模式下同时在途的请求数
+    'max_connections_per_host': 10,  # 每个主机的最大长连接数
+    'session_pool_hosts': 100,  # 连接池缓存的主机数
+    'strategy_cache_ttl': 1800,  # 域名抓取方式记录的有效期(秒)
+    'strategy_failure_threshold': 2,  # 连续失败多少次后降低该方式的优先级
+    'browser_pool_size': 2,  # 同时运行的无头浏览器数量
+    'browser_max_pages': 50,  # 每个浏览器渲染多少页面后重启
+    'fast_render': False,  # 快速渲染：拦截无关资源，网络空闲即返回
+    'parse_processes': 0,  # 解析/正文提取子进程数（0表示在抓取线程内解析）
+    'host_concurrency': 2,  # 每个主机同时进行的请求数上限
+    'host_burst': 1,  # 每个主机令牌桶容量（允许的突发请求数）
+    'host_overrides': {},  # 按主机覆盖: {"example.com": {"min_delay": 2, "concurrency": 1, "burst": 1}}
+    'adaptive_throttle': True,  # 自适应限速：429/503退避，快速200响应逐步提速
+    'adaptive_fast_response': 0.5,  # 响应快于该秒数视为快速响应
+    'adaptive_min_factor': 0.5,  # 提速时最小间隔可降到request_delay的倍数
+    'proxy_failure_threshold': 3,  # 代理连续失败次数达到该值后隔离
+    'proxy_cooldown': 30,  # 代理首次隔离的秒数，之后每次隔离翻倍
+    'proxy_max_cooldown': 1800,  # 代理隔离时长上限（秒）
+    'proxy_pin_per_host': False,  # 同一主机固定使用同一个代理（会话型站点）
+    'proxy_probe_url': 'http://httpbin.org/ip',  # 代理检测地址（可指向本地测试服务）
+    'proxy_probe_timeout': 10,  # 代理检测超时（秒）
+    'proxy_probe_concurrency': 100,  # 并发检测的代理数
+    'retry_deadline': 60,  # 单个URL（含全部重试）的最长耗时（秒）
+    'retry_backoff_base': 0.5,  # 重试退避基数（秒），每次翻倍并随机抖动
+    'retry_backoff_max': 10,  # 单次重试等待上限（秒）
+    'retry_budget_ratio': 0.2,  # 全局重试预算：重试次数最多为请求数的该比例
+    'retry_budget_min': 5,  # 全局重试预算每秒保底的重试次数
+    'render_block_resources': ['image', 'font', 'media', 'stylesheet'],  # 快速渲染时拦截的资源类型
+    'render_block_domains': [  # 快速渲染时拦截的第三方域名
+        'google-analytics.com', 'googletagmanager.com', 'doubleclick.net',
+        'googlesyndication.com', 'facebook.net', 'hotjar.com', 'hm.baidu.com', 'cnzz.com',
+    ],
+    'render_idle_ms': 500,  # 多长时间没有新请求视为网络空闲(毫秒)
+    'render_wait_ms': 3000,  # 等待网络空闲的最长时间(毫秒)
+    'render_time_budget': 10,  # 快速渲染每个页面的总时间上限(秒)
+    'parser_backend': 'lxml',  # 链接/图片提取的解析后端: lxml / selectolax / bs4
+    'ua_pool_size': 200,  # UA样本池大小
+    'sticky_user_agent': False,  # 同一主机始终使用同一个UA
+    'obey_robots': True,  # 整站爬取时跳过robots.txt禁止的链接
+    'robots_cache_ttl': 86400,  # robots.txt缓存有效期(秒)
+    'robots_negative_ttl': 3600,  # robots.txt获取失败时的缓存有效期(秒)
+    'robots_cache_file': 'robots_cache.json',  # robots.txt缓存文件
 }
 
 # Redis连接池
@@ -114,14 +193,71 @@ REFERERS = [
     'https://www.ecosia.org/',
 ]
 
-def get_random_ua():
-    try:
-        # 使用fake_useragent库获取随机UA
-        ua = fake_useragent.UserAgent().random
+class UserAgentProvider:
+    """进程级UA提供器
+    
+    首次使用时加载一次fake_useragent数据库，按市场占比取前ua_pool_size个UA作为加权样本池，
+    之后每次取UA只是一次加权随机抽样。加载失败时使用本地USER_AGENTS列表。
+    开启sticky_user_agent后同一主机始终使用同一个UA。
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pool = None
+        self._cum_weights = None
+        self._sticky = {}
+    
+    def _load(self):
+        pool = []
+        weights = []
+        try:
+            ua = fake_useragent.UserAgent()
+            browsers = getattr(ua, 'data_browsers', None)
+            if browsers:
+                browsers = sorted(browsers, key=lambda b: b.get('percent', 0), reverse=True)
+                for browser in browsers[:CRAWL_SETTINGS['ua_pool_size']]:
+                    pool.append(browser['useragent'])
+                    weights.append(max(browser.get('percent', 0), 0.001))
+            else:
+                # 旧版本没有data_browsers，预先抽样一批
+                pool = list({ua.random for _ in range(CRAWL_SETTINGS['ua_pool_size'])})
+                weights = [1] * len(pool)
+        except Exception as e:
+            logging.warning(f"加载fake_useragent失败: {str(e)}，使用本地UA列表")
+        
+        if not pool:
+            pool = list(USER_AGENTS)
+            weights = [1] * len(pool)
+        
+        cum_weights = []
+        total = 0
+        for weight in weights:
+            total += weight
+            cum_weights.append(total)
+        self._cum_weights = cum_weights
+        self._pool = pool
+    
+    def random(self):
+        """加权随机抽取一个UA"""
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._load()
+        return random.choices(self._pool, cum_weights=self._cum_weights)[0]
+    
+    def for_host(self, host):
+        """返回该主机固定使用的UA"""
+        ua = self._sticky.get(host)
+        if ua is None:
+            ua = self._sticky.setdefault(host, self.random())
         return ua
-    except:
-        # 如果获取失败，使用本地列表
-        return random.choice(USER_AGENTS)
+
+UA_PROVIDER = UserAgentProvider()
+
+def get_random_ua(host=None):
+    """获取UA，传入host且开启sticky_user_agent时同一主机返回同一个UA"""
+    if host and CRAWL_SETTINGS['sticky_user_agent']:
+        return UA_PROVIDER.for_host(host)
+    return UA_PROVIDER.random()
 
 def get_random_referer():
     return random.choice(REFERERS)
@@ -137,147 +273,1138 @@ def validate_url(url):
     
     return url
 
+class RobotsCache:
+    """按 scheme+host 缓存robots.txt
+    
+    - 正常结果缓存robots_cache_ttl秒；获取失败(网络错误/5xx)按robots_negative_ttl做短期负缓存
+    - 新主机进入前沿队列时可调用prefetch在后台预取，不阻塞抓取线程
+    - 提供Crawl-delay/Request-rate供调度使用
+    - 原始robots.txt内容持久化到robots_cache_file，重启后无需重新下载；
+      新条目攒够SAVE_DELAY秒后合并写盘一次（退出时再写一次），避免每个新主机都重写整个文件
+    """
+    SAVE_DELAY = 5.0
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._entries = {}
+        self._loaded = False
+        self._dirty = False
+        self._save_timer = None
+        self._pending = {}
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+    
+    @staticmethod
+    def _key(url):
+        parsed = urlparse.urlparse(url)
+        return f"{parsed.scheme}://{parsed.netloc}"
+    
+    @staticmethod
+    def _build_parser(record):
+        rp = RobotFileParser()
+        status = record['status']
+        if status is None:
+            # 无法获取robots.txt，默认允许爬取
+            rp.allow_all = True
+        elif status in (401, 403) or status >= 500:
+            rp.disallow_all = True
+        elif status >= 400:
+            rp.allow_all = True
+        else:
+            rp.parse(record['body'].splitlines())
+        return rp
+    
+    def _load(self):
+        """从磁盘加载缓存（只执行一次）"""
+        self._loaded = True
+        try:
+            with open(CRAWL_SETTINGS['robots_cache_file'], 'r', encoding='utf-8') as f:
+                records = json.load(f)
+            for key, record in records.items():
+                self._entries[key] = (record, self._build_parser(record))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f"加载robots缓存失败: {str(e)}")
+    
+    def _schedule_save(self):
+        """标记缓存已变化，SAVE_DELAY秒后统一写盘"""
+        with self._lock:
+            self._dirty = True
+            if self._save_timer is not None:
+                return
+            self._save_timer = threading.Timer(self.SAVE_DELAY, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+    
+    def flush(self):
+        """把有变化的缓存写入磁盘"""
+        with self._save_lock:
+            with self._lock:
+                self._save_timer = None
+                if not self._dirty:
+                    return
+                self._dirty = False
+                records = {key: record for key, (record, _) in self._entries.items()}
+            try:
+                tmp_file = f"{CRAWL_SETTINGS['robots_cache_file']}.{os.getpid()}.tmp"
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    json.dump(records, f, ensure_ascii=False)
+                os.replace(tmp_file, CRAWL_SETTINGS['robots_cache_file'])
+            except Exception as e:
+                logging.warning(f"保存robots缓存失败: {str(e)}")
+    
+    def _expired(self, record):
+        ttl = CRAWL_SETTINGS['robots_cache_ttl']
+        if record['status'] is None or record['status'] >= 500:
+            ttl = CRAWL_SETTINGS['robots_negative_ttl']
+        return time.time() - record['fetched'] > ttl
+    
+    def _download(self, key):
+        record = {'fetched': time.time(), 'status': None, 'body': ''}
+        try:
+            proxy = get_current_proxy() if CRAWL_SETTINGS['use_proxy'] else None
+            response = requests_retry_session(proxy).get(
+                key + "/robots.txt",
+                headers={'User-Agent': get_random_ua(urlparse.urlparse(key).netloc)},
+                timeout=CRAWL_SETTINGS['timeout'],
+                verify=not CRAWL_SETTINGS['ignore_ssl']
+            )
+            record['status'] = response.status_code
+            if response.status_code < 400:
+                record['body'] = response.text
+        except Exception as e:
+            logging.warning(f"无法获取robots.txt: {str(e)}")
+        
+        parser = self._build_parser(record)
+        with self._lock:
+            self._entries[key] = (record, parser)
+            self._pending.pop(key, None)
+        self._schedule_save()
+        return parser
+    
+    def _get(self, url):
+        key = self._key(url)
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            entry = self._entries.get(key)
+            if entry and not self._expired(entry[0]):
+                return entry[1]
+            future = self._pending.get(key)
+        
+        # 正在后台预取时等待其结果，避免重复请求
+        if future is not None:
+            return future.result()
+        return self._download(key)
+    
+    def prefetch(self, url):
+        """后台预取该主机的robots.txt（已缓存或正在获取时不重复请求）"""
+        key = self._key(url)
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            entry = self._entries.get(key)
+            if (entry and not self._expired(entry[0])) or key in self._pending:
+                return
+            self._pending[key] = self._executor.submit(self._download, key)
+    
+    def can_fetch(self, url, useragent="*"):
+        return self._get(url).can_fetch(useragent, url)
+    
+    def crawl_delay(self, url, useragent="*"):
+        """返回robots.txt要求的最小请求间隔(秒)，综合Crawl-delay和Request-rate，没有要求时为0"""
+        return self._parser_delay(self._get(url), useragent)
+    
+    def cached_crawl_delay(self, url, useragent="*"):
+        """同crawl_delay，但只使用已缓存的robots.txt，未缓存时返回0，不发起请求"""
+        key = self._key(url)
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            entry = self._entries.get(key)
+        return self._parser_delay(entry[1], useragent) if entry else 0.0
+    
+    @staticmethod
+    def _parser_delay(rp, useragent):
+        delay = 0.0
+        try:
+            crawl_delay = rp.crawl_delay(useragent)
+            if crawl_delay:
+                delay = float(crawl_delay)
+            rate = rp.request_rate(useragent)
+            if rate and rate.requests:
+                delay = max(delay, rate.seconds / rate.requests)
+        except Exception:
+            pass
+        return delay
+
+ROBOTS_CACHE = RobotsCache()
+atexit.register(ROBOTS_CACHE.flush)
+
 def get_robots_permission(url):
-    parsed = urlparse.urlparse(url)
-    base_url = f"{parsed.scheme}://{parsed.netloc}"
-    rp = RobotFileParser()
-    rp.set_url(urlparse.urljoin(base_url, "/robots.txt"))
-    try:
-        rp.read()
-        return rp.can_fetch("*", url)
-    except Exception as e:
-        logging.warning(f"无法获取robots.txt: {str(e)}")
-        # 如果无法获取robots.txt，默认允许爬取
-        return True
+    return ROBOTS_CACHE.can_fetch(url)
 
-def rotate_proxy():
-    """轮换使用代理列表中的下一个代理"""
-    if not CRAWL_SETTINGS['proxy_list']:
-        return None
+class ProxyPool:
+    """线程安全的代理池
+    
+    按代理记录成功率、延迟（指数移动平均）和封禁信号（403/验证码/Cloudflare），
+    按得分加权随机选择；连续失败或被封的代理进入隔离期，隔离时长按次数指数增长。
+    可选按主机固定代理，固定的代理被隔离后自动换绑。
+    """
+    # 延迟的指数移动平均系数
+    LATENCY_ALPHA = 0.3
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._proxies = {}
+        self._source = ()
+        self._pins = {}
+    
+    def _new_record(self):
+        return {
+            'successes': 0,
+            'failures': 0,
+            'bans': 0,
+            'consecutive_failures': 0,
+            'strikes': 0,
+            'latency': None,
+            'quarantine_until': 0.0,
+        }
+    
+    def _sync(self):
+        """代理列表变化时重建，保留仍在列表中的代理的统计"""
+        source = tuple(CRAWL_SETTINGS['proxy_list'])
+        if source != self._source:
+            self._proxies = {p: self._proxies.get(p) or self._new_record() for p in source}
+            self._pins = {h: p for h, p in self._pins.items() if p in self._proxies}
+            self._source = source
+    
+    def _score(self, record):
+        # 平滑后的成功率，被封记为额外失败；延迟越低得分越高
+        rate = (record['successes'] + 1) / (record['successes'] + record['failures'] + record['bans'] + 2)
+        latency = record['latency'] if record['latency'] is not None else 1.0
+        return rate / (0.5 + latency)
+    
+    def choose(self, host=None):
+        """选择一个代理；所有代理都在隔离期时返回最早解除隔离的代理"""
+        with self._lock:
+            self._sync()
+            if not self._proxies:
+                return None
+            now = time.time()
+            available = [p for p, r in self._proxies.items() if r['quarantine_until'] <= now]
+            
+            pin = host is not None and CRAWL_SETTINGS['proxy_pin_per_host']
+            if pin and self._pins.get(host) in available:
+                return self._pins[host]
+            
+            if available:
+                weights = [self._score(self._proxies[p]) for p in available]
+                proxy = random.choices(available, weights=weights)[0]
+            else:
+                proxy = min(self._proxies, key=lambda p: self._proxies[p]['quarantine_until'])
+            if pin:
+                self._pins[host] = proxy
+            return proxy
+    
+    def report(self, proxy, success, latency=None, banned=False):
+        """记录一次使用结果：success为请求是否成功，banned为是否出现封禁信号"""
+        with self._lock:
+            self._sync()
+            record = self._proxies.get(proxy)
+            if record is None:
+                return
+            if success and not banned:
+                record['successes'] += 1
+                record['consecutive_failures'] = 0
+                record['strikes'] = max(0, record['strikes'] - 1)
+                if latency is not None:
+                    if record['latency'] is None:
+                        record['latency'] = latency
+                    else:
+                        record['latency'] += self.LATENCY_ALPHA * (latency - record['latency'])
+                return
+            
+            if banned:
+                record['bans'] += 1
+            else:
+                record['failures'] += 1
+            record['consecutive_failures'] += 1
+            if banned or record['consecutive_failures'] >= CRAWL_SETTINGS['proxy_failure_threshold']:
+                self._quarantine(proxy, record)
+    
+    def is_available(self, proxy):
+        """代理是否仍在列表中且未被隔离"""
+        with self._lock:
+            self._sync()
+            record = self._proxies.get(proxy)
+            return record is not None and record['quarantine_until'] <= time.time()
     
-    CRAWL_SETTINGS['current_proxy_index'] = (CRAWL_SETTINGS['current_proxy_index'] + 1) % len(CRAWL_SETTINGS['proxy_list'])
-    return CRAWL_SETTINGS['proxy_list'][CRAWL_SETTINGS['current_proxy_index']]
+    def record_probe(self, proxy, ok, latency=None):
+        """记录一次代理检测结果：可用则解除隔离，不可用则立即隔离"""
+        with self._lock:
+            self._sync()
+            record = self._proxies.get(proxy)
+            if record is None:
+                return
+            if ok:
+                record['quarantine_until'] = 0.0
+                record['consecutive_failures'] = 0
+                record['successes'] += 1
+                if latency is not None:
+                    record['latency'] = latency
+            else:
+                record['failures'] += 1
+                self._quarantine(proxy, record)
+    
+    def _quarantine(self, proxy, record):
+        cooldown = min(
+            CRAWL_SETTINGS['proxy_cooldown'] * 2 ** record['strikes'],
+            CRAWL_SETTINGS['proxy_max_cooldown']
+        )
+        record['strikes'] += 1
+        record['consecutive_failures'] = 0
+        record['quarantine_until'] = time.time() + cooldown
+        # 解除绑定到该代理的主机，下次请求重新选择
+        self._pins = {h: p for h, p in self._pins.items() if p != proxy}
+        logging.warning(f"代理 {proxy} 已隔离 {cooldown:.0f} 秒")
+    
+    def snapshot(self):
+        """返回各代理的统计副本（用于界面显示和调试）"""
+        with self._lock:
+            self._sync()
+            now = time.time()
+            return {
+                p: dict(r, score=self._score(r), quarantined=r['quarantine_until'] > now)
+                for p, r in self._proxies.items()
+            }
+
+PROXY_POOL = ProxyPool()
+
+# 可能是反爬拦截的响应状态；只对这些状态检查页面中的验证码/质询特征
+CHALLENGE_STATUS = frozenset({403, 429, 503})
+
+def is_ban_response(status_code, text):
+    """响应是否带有封禁信号（403、或拦截状态下的验证码页/Cloudflare质询）
+    
+    正常页面也可能引用验证码脚本（如登录框的reCAPTCHA），所以200等状态不检查页面内容
+    """
+    if status_code == 403:
+        return True
+    if status_code not in CHALLENGE_STATUS:
+        return False
+    head = (text or '')[:5000].lower()
+    return 'captcha' in head or 'cf-chl' in head or 'attention required' in head
+
+def report_proxy_response(proxy, status_code, text, latency):
+    """把一次响应记入代理池：封禁信号隔离代理，407/502/504视为代理自身故障"""
+    if not proxy or not CRAWL_SETTINGS['proxy_list']:
+        return
+    PROXY_POOL.report(
+        proxy,
+        status_code not in (407, 502, 504),
+        latency=latency,
+        banned=is_ban_response(status_code, text)
+    )
+
+def rotate_proxy(failed_proxy=None, host=None):
+    """记录失败的代理并换用代理池推荐的下一个代理"""
+    if failed_proxy and CRAWL_SETTINGS['proxy_list']:
+        PROXY_POOL.report(failed_proxy, False)
+    return get_current_proxy(host)
 
-def get_current_proxy():
-    """获取当前使用的代理"""
+def get_current_proxy(host=None):
+    """获取当前使用的代理（有代理列表时由代理池按得分选择）"""
     if not CRAWL_SETTINGS['use_proxy']:
         return None
     
     if CRAWL_SETTINGS['proxy_list']:
-        return CRAWL_SETTINGS['proxy_list'][CRAWL_SETTINGS['current_proxy_index']]
+        return PROXY_POOL.choose(host)
     
     return CRAWL_SETTINGS['proxy']
 
+def proxy_usable(proxy):
+    """已绑定在长期资源（如常驻浏览器）上的代理是否仍可继续使用"""
+    if not CRAWL_SETTINGS['use_proxy']:
+        return proxy is None
+    if CRAWL_SETTINGS['proxy_list']:
+        return PROXY_POOL.is_available(proxy)
+    return proxy == CRAWL_SETTINGS['proxy']
+
+IPV4_PATTERN = re.compile(r'\b(?:\d{1,3}\.){3}\d{1,3}\b')
+
+def detect_public_ip(probe_url=None, timeout=None):
+    """不经代理访问检测地址，返回本机出口IP（用于判断代理是否透明）"""
+    try:
+        response = requests.get(
+            probe_url or CRAWL_SETTINGS['proxy_probe_url'],
+            timeout=timeout or CRAWL_SETTINGS['proxy_probe_timeout']
+        )
+        match = IPV4_PATTERN.search(response.text)
+        return match.group(0) if match else None
+    except Exception:
+        return None
+
+def probe_proxy(proxy, probe_url=None, timeout=None, real_ip=None):
+    """通过代理访问检测地址，返回 {proxy, ok, latency, anonymity, error}
+    
+    anonymity: transparent（暴露真实IP）/ anonymous（暴露代理头）/ elite，无法判断时为None
+    """
+    result = {'proxy': proxy, 'ok': False, 'latency': None, 'anonymity': None, 'error': None}
+    start_time = time.time()
+    try:
+        response = requests.get(
+            probe_url or CRAWL_SETTINGS['proxy_probe_url'],
+            proxies=proxy_dict(proxy),
+            timeout=timeout or CRAWL_SETTINGS['proxy_probe_timeout']
+        )
+        result['latency'] = time.time() - start_time
+        if response.status_code != 200:
+            result['error'] = f"HTTP状态码 {response.status_code}"
+            return result
+        result['ok'] = True
+        
+        body = response.text.lower()
+        if real_ip and real_ip in body:
+            result['anonymity'] = 'transparent'
+        elif any(h in body for h in ('via', 'x-forwarded-for', 'proxy-connection')):
+            result['anonymity'] = 'anonymous'
+        elif real_ip:
+            result['anonymity'] = 'elite'
+    except Exception as e:
+        result['error'] = str(e)
+    return result
+
 def test_proxy(proxy):
     """测试代理是否可用"""
-    test_url = "http://httpbin.org/ip"
-    try:
-        response = requests.get(test_url, proxies={"http": proxy, "https": proxy}, timeout=10)
-        if response.status_code == 200:
-            return True
-    except:
-        pass
-    return False
+    return probe_proxy(proxy)['ok']
+
+def validate_proxies(proxies, probe_url=None, concurrency=None, timeout=None, stop_event=None):
+    """并发检测代理，按完成顺序逐个产出检测结果，结果同时记入代理池"""
+    if concurrency is None:
+        concurrency = CRAWL_SETTINGS['proxy_probe_concurrency']
+    real_ip = detect_public_ip(probe_url, timeout)
+    
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(proxies)))) as executor:
+        futures = [executor.submit(probe_proxy, p, probe_url, timeout, real_ip) for p in proxies]
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                result = future.result()
+                PROXY_POOL.record_probe(result['proxy'], result['ok'], result['latency'])
+                yield result
+                if stop_event is not None and stop_event.is_set():
+                    break
+        finally:
+            for future in futures:
+                future.cancel()
+
+# 所有会话共享的默认请求头
+DEFAULT_HEADERS = {
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.9,zh-CN;q=0.8,zh;q=0.7',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+    'Pragma': 'no-cache',
+    'Cache-Control': 'no-cache',
+    'TE': 'Trailers',
+}
+
+def proxy_dict(proxy):
+    """把代理地址转换成requests使用的proxies字典"""
+    if not proxy:
+        return None
+    return {
+        'http': proxy,
+        'https': proxy,
+    }
 
-def requests_retry_session():
+def build_retry_session():
+    """创建一个带重试和连接池的requests会话"""
     session = requests.Session()
+    # 只在连接阶段快速重试一次；按状态码的重试由download_page的重试循环统一处理，
+    # 避免两层重试相乘，429/503交给HOST_SCHEDULER按主机退避
     retry = Retry(
-        total=CRAWL_SETTINGS['retry_times'],
+        total=1,
+        connect=1,
+        read=0,
+        status=0,
+        other=0,
         backoff_factor=0.3,
-        status_forcelist=[500, 502, 503, 504, 429, 403, 404, 408],
         allowed_methods=['GET', 'POST'],
-        respect_retry_after_header=True
+        raise_on_status=False,
+        respect_retry_after_header=False
+    )
+    # pool_maxsize限制每个主机的连接数，pool_block使超出的请求排队等待而不是新建连接
+    adapter = HTTPAdapter(
+        max_retries=retry,
+        pool_connections=CRAWL_SETTINGS['session_pool_hosts'],
+        pool_maxsize=CRAWL_SETTINGS['max_connections_per_host'],
+        pool_block=True
     )
-    adapter = HTTPAdapter(max_retries=retry)
     session.mount('http://', adapter)
     session.mount('https://', adapter)
     
     # 添加自定义请求头
-    session.headers.update({
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Language': 'en-US,en;q=0.9,zh-CN;q=0.8,zh;q=0.7',
-        'Accept-Encoding': 'gzip, deflate, br',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1',
-        'Pragma': 'no-cache',
-        'Cache-Control': 'no-cache',
-        'TE': 'Trailers',
-    })
+    session.headers.update(DEFAULT_HEADERS)
     
     return session
 
-def get_redis_connection():
-    """获取Redis连接"""
-    try:
-        return redis.Redis(
-            host=CRAWL_SETTINGS['redis_host'],
-            port=CRAWL_SETTINGS['redis_port'],
-            db=CRAWL_SETTINGS['redis_db'],
-            password=CRAWL_SETTINGS['redis_password'],
+class SessionPool:
+    """进程级HTTP会话池
+    
+    按 (代理, TLS指纹) 缓存长连接会话，同一主机的重复请求复用TCP/TLS连接。
+    requests和cloudscraper会话是线程安全的，全局共享；
+    curl_cffi会话不能跨线程使用，因此每个线程各自持有一份。
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._local = threading.local()
+    
+    def _settings_key(self):
+        # 这些设置变化后需要重建会话
+        return (
+            CRAWL_SETTINGS['retry_times'],
+            CRAWL_SETTINGS['max_connections_per_host'],
+            CRAWL_SETTINGS['session_pool_hosts'],
+        )
+    
+    def _get_shared(self, key, factory):
+        key = key + self._settings_key()
+        session = self._sessions.get(key)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(key)
+                if session is None:
+                    session = factory()
+                    self._sessions[key] = session
+        return session
+    
+    def get_session(self, proxy=None):
+        """获取requests会话"""
+        def factory():
+            session = build_retry_session()
+            if proxy:
+                session.proxies.update(proxy_dict(proxy))
+            return session
+        return self._get_shared(('requests', proxy), factory)
+    
+    def get_scraper(self, proxy=None):
+        """获取cloudscraper会话（保存已通过的Cloudflare验证cookie）"""
+        def factory():
+            scraper = cloudscraper.create_scraper()
+            if proxy:
+                scraper.proxies.update(proxy_dict(proxy))
+            return scraper
+        return self._get_shared(('cloudscraper', proxy), factory)
+    
+    def get_curl_session(self, proxy=None, impersonate="chrome110"):
+        """获取当前线程的curl_cffi会话"""
+        sessions = getattr(self._local, 'sessions', None)
+        if sessions is None:
+            sessions = self._local.sessions = {}
+        key = (proxy, impersonate)
+        session = sessions.get(key)
+        if session is None:
+            session = curl_requests.Session(impersonate=impersonate, proxies=proxy_dict(proxy))
+            sessions[key] = session
+        return session
+    
+    def clear(self):
+        """关闭所有共享会话（各线程的curl_cffi会话随线程回收）"""
+        with self._lock:
+            for session in self._sessions.values():
+                try:
+                    session.close()
+                except Exception:
+                    pass
+            self._sessions.clear()
+
+SESSION_POOL = SessionPool()
+
+def requests_retry_session(proxy=None):
+    """获取共享的requests会话（保留旧接口）"""
+    return SESSION_POOL.get_session(proxy)
+
+def get_redis_pool():
+    """获取共享的Redis连接池，Redis设置变化后重建"""
+    global redis_pool
+    params = (
+        CRAWL_SETTINGS['redis_host'],
+        CRAWL_SETTINGS['redis_port'],
+        CRAWL_SETTINGS['redis_db'],
+        CRAWL_SETTINGS['redis_password'],
+    )
+    kwargs = redis_pool.connection_kwargs
+    if (kwargs.get('host'), kwargs.get('port'), kwargs.get('db'), kwargs.get('password')) != params:
+        redis_pool.disconnect()
+        redis_pool = redis.ConnectionPool(
+            host=params[0],
+            port=params[1],
+            db=params[2],
+            password=params[3],
             decode_responses=True
         )
+    return redis_pool
+
+def get_redis_connection():
+    """获取Redis连接（复用共享连接池）"""
+    try:
+        return redis.Redis(connection_pool=get_redis_pool())
     except Exception as e:
         logging.error(f"Redis连接失败: {str(e)}")
         return None
 
+def bloom_parameters(capacity, error_rate):
+    """按容量和误判率计算Bloom Filter的位数和哈希函数个数"""
+    bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+    hashes = max(1, int(round(bits / capacity * math.log(2))))
+    return bits, hashes
+
+def bloom_positions(item, bits, hashes):
+    """双重哈希：由一次blake2b摘要派生出全部哈希位置"""
+    digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], 'little')
+    h2 = int.from_bytes(digest[8:], 'little') | 1
+    return [(h1 + i * h2) % bits for i in range(hashes)]
+
+def bloom_tier_error_rate():
+    """去重时依次检查进程内和Redis两层Bloom Filter，两层的误判率相加，各分一半预算"""
+    return CRAWL_SETTINGS['bloom_error_rate'] / 2
+
+class BloomFilter:
+    """固定容量的位数组Bloom Filter"""
+    
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bits, self.hashes = bloom_parameters(capacity, error_rate)
+        self.array = bytearray((self.bits + 7) // 8)
+        self.count = 0
+    
+    def __contains__(self, item):
+        array = self.array
+        return all(array[p >> 3] & (1 << (p & 7)) for p in bloom_positions(item, self.bits, self.hashes))
+    
+    def add(self, item):
+        """添加元素，返回元素此前是否不存在"""
+        array = self.array
+        added = False
+        for p in bloom_positions(item, self.bits, self.hashes):
+            mask = 1 << (p & 7)
+            if not array[p >> 3] & mask:
+                array[p >> 3] |= mask
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+class ScalableBloomFilter:
+    """可扩展Bloom Filter
+    
+    当前层写满后追加一层：容量翻倍、误判率减半，总误判率不超过error_rate。
+    """
+    
+    def __init__(self, initial_capacity, error_rate):
+        self.initial_capacity = initial_capacity
+        self.error_rate = error_rate
+        self.filters = []
+        self._grow()
+    
+    def _grow(self):
+        layer = len(self.filters)
+        self.filters.append(BloomFilter(
+            self.initial_capacity * 2 ** layer,
+            self.error_rate * 0.5 ** (layer + 1)
+        ))
+    
+    def __contains__(self, item):
+        return any(item in f for f in self.filters)
+    
+    def __len__(self):
+        return sum(f.count for f in self.filters)
+    
+    def add(self, item):
+        """添加元素，返回元素此前是否不存在"""
+        if item in self:
+            return False
+        current = self.filters[-1]
+        if current.count >= current.capacity:
+            self._grow()
+            current = self.filters[-1]
+        return current.add(item)
+
+class RedisScalableBloom:
+    """RedisBloom模块不可用时的回退：基于Redis位图的可扩展Bloom Filter
+    
+    每层一个位图键，容量和误判率保存在meta哈希中，保证所有工作者使用相同的哈希参数。
+    """
+    
+    def __init__(self, key):
+        self.key = key
+        self.meta_key = f"{key}:meta"
+        self._params = None
+    
+    def _layer(self, layer):
+        capacity, error_rate = self._params
+        return bloom_parameters(capacity * 2 ** layer, error_rate * 0.5 ** (layer + 1))
+    
+    def _layers(self, r):
+        """读取当前层数（首次使用时写入参数）"""
+        if self._params is None:
+            pipe = r.pipeline(transaction=False)
+            pipe.hsetnx(self.meta_key, 'capacity', CRAWL_SETTINGS['bloom_capacity'])
+            pipe.hsetnx(self.meta_key, 'error_rate', bloom_tier_error_rate())
+            pipe.hsetnx(self.meta_key, 'layers', 1)
+            pipe.hmget(self.meta_key, 'capacity', 'error_rate')
+            capacity, error_rate = pipe.execute()[-1]
+            self._params = (int(capacity), float(error_rate))
+        return int(r.hget(self.meta_key, 'layers') or 1)
+    
+    def contains_many(self, r, urls):
+        layers = self._layers(r)
+        pipe = r.pipeline(transaction=False)
+        for url in urls:
+            for layer in range(layers):
+                bits, hashes = self._layer(layer)
+                args = []
+                for p in bloom_positions(url, bits, hashes):
+                    args += ['GET', 'u1', p]
+                pipe.execute_command('BITFIELD', f"{self.key}:{layer}", *args)
+        results = pipe.execute()
+        return [
+            any(all(results[i * layers + layer]) for layer in range(layers))
+            for i in range(len(urls))
+        ]
+    
+    def add_many(self, r, urls):
+        layers = self._layers(r)
+        while urls:
+            # 按当前层剩余容量分批写入，写满后由越过容量的工作者扩容
+            current = layers - 1
+            capacity = self._params[0] * 2 ** current
+            count = int(r.hget(self.meta_key, f"count:{current}") or 0)
+            room = max(1, capacity - count)
+            batch, urls = urls[:room], urls[room:]
+            
+            bits, hashes = self._layer(current)
+            pipe = r.pipeline(transaction=False)
+            for url in batch:
+                args = []
+                for p in bloom_positions(url, bits, hashes):
+                    args += ['SET', 'u1', p, 1]
+                pipe.execute_command('BITFIELD', f"{self.key}:{current}", *args)
+            # BITFIELD SET返回旧值，旧值全为1说明元素已存在
+            added = sum(1 for old in pipe.execute() if not all(old))
+            if added:
+                count = r.hincrby(self.meta_key, f"count:{current}", added)
+                if count - added < capacity <= count:
+                    r.hincrby(self.meta_key, 'layers', 1)
+            if urls:
+                layers = int(r.hget(self.meta_key, 'layers') or 1)
+
+class RedisFrontier:
+    """分布式模式下的Redis前沿队列和去重集合
+    
+    所有操作走共享连接池，批量接口把整批URL合并成一次往返：
+    BF.MADD/BF.MEXISTS批量去重，LPUSH一次推入整批链接，RPOP count一次取出多个URL。
+    去重前有一层进程内Bloom Filter：命中的URL不再访问Redis，新标记的URL攒批后同步。
+    """
+    QUEUE_KEY = 'spider:start_urls'
+    STREAM_KEY = 'spider:stream'
+    GROUP_NAME = 'spider:workers'
+    # 分发次数超过queue_max_deliveries的URL移入死信流，便于排查
+    DEAD_KEY = 'spider:dead'
+    DEAD_MAXLEN = 100000
+    # 取出URL时用SET NX占用的处理标记，同一URL的重复消息在占用期内直接丢弃
+    CLAIM_PREFIX = 'spider:claim:'
+    BLOOM_KEY = 'urls:bloom'
+    FALLBACK_BLOOM_KEY = 'urls:bloom:bits'
+    # 单条命令携带的最大参数个数，避免超大命令阻塞Redis
+    CHUNK_SIZE = 1000
+    
+    def __init__(self):
+        # 可靠队列模式下每个进程是消费组里的一个消费者
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self._leases = {}  # url -> 流消息ID列表（同一URL可能在流中出现多次），确认时使用
+        self._lock = threading.Lock()
+        self._group_ready = False
+        self._local = None
+        self._pending = []  # 已在本地标记、尚未同步到Redis的URL
+        self._last_sync = time.time()
+        self._bloom_module = None  # Redis是否加载了RedisBloom模块，首次使用时探测
+        self._fallback = RedisScalableBloom(self.FALLBACK_BLOOM_KEY)
+    
+    @property
+    def local(self):
+        """进程内Bloom Filter（首次使用时按当前设置创建）"""
+        if self._local is None:
+            self._local = ScalableBloomFilter(
+                CRAWL_SETTINGS['bloom_capacity'],
+                bloom_tier_error_rate()
+            )
+        return self._local
+    
+    def _detect_bloom_module(self, r):
+        if self._bloom_module is None:
+            try:
+                r.execute_command(
+                    'BF.RESERVE', self.BLOOM_KEY,
+                    bloom_tier_error_rate(),
+                    CRAWL_SETTINGS['bloom_capacity'],
+                    'EXPANSION', 2
+                )
+                self._bloom_module = True
+            except redis.ResponseError as e:
+                # 键已存在说明模块可用；未知命令说明模块缺失
+                self._bloom_module = 'exists' in str(e).lower()
+                if not self._bloom_module:
+                    logging.warning("Redis未加载RedisBloom模块，使用位图实现的可扩展Bloom Filter")
+        return self._bloom_module
+    
+    def _redis_seen(self, r, urls):
+        if not self._detect_bloom_module(r):
+            return self._fallback.contains_many(r, urls)
+        pipe = r.pipeline(transaction=False)
+        for chunk in self._chunks(urls):
+            pipe.execute_command('BF.MEXISTS', self.BLOOM_KEY, *chunk)
+        return [bool(flag) for chunk in pipe.execute() for flag in chunk]
+    
+    def _redis_add(self, r, urls):
+        if not self._detect_bloom_module(r):
+            self._fallback.add_many(r, urls)
+            return
+        pipe = r.pipeline(transaction=False)
+        for chunk in self._chunks(urls):
+            pipe.execute_command('BF.MADD', self.BLOOM_KEY, *chunk)
+        pipe.execute()
+    
+    def _ensure_group(self, r):
+        if self._group_ready:
+            return
+        try:
+            r.xgroup_create(self.STREAM_KEY, self.GROUP_NAME, id='0', mkstream=True)
+        except redis.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+        self._group_ready = True
+    
+    def _chunks(self, items):
+        for i in range(0, len(items), self.CHUNK_SIZE):
+            yield items[i:i + self.CHUNK_SIZE]
+    
+    def seen_many(self, urls):
+        """批量检查URL是否已爬取，返回与urls等长的布尔列表"""
+        urls = list(urls)
+        if not urls:
+            return []
+        with self._lock:
+            local = self.local
+            flags = [url in local for url in urls]
+        misses = [url for url, hit in zip(urls, flags) if not hit]
+        if not misses:
+            return flags
+        
+        r = get_redis_connection()
+        if not r:
+            return flags
+        try:
+            remote = self._redis_seen(r, misses)
+        except Exception as e:
+            logging.error(f"检查URL去重失败: {str(e)}")
+            return flags
+        
+        # 其他工作者已爬取的URL记入本地，之后的检查不再访问Redis
+        remote_hits = {url for url, hit in zip(misses, remote) if hit}
+        if remote_hits:
+            with self._lock:
+                for url in remote_hits:
+                    local.add(url)
+        return [hit or url in remote_hits for url, hit in zip(urls, flags)]
+    
+    def mark_many(self, urls):
+        """批量标记URL为已爬取（先记入本地，攒批后同步到Redis）"""
+        with self._lock:
+            local = self.local
+            self._pending.extend(url for url in urls if local.add(url))
+            due = (
+                len(self._pending) >= CRAWL_SETTINGS['bloom_sync_batch']
+                or time.time() - self._last_sync >= CRAWL_SETTINGS['bloom_sync_interval']
+            )
+        if due:
+            self.flush()
+    
+    def flush(self):
+        """把本地新标记的URL批量同步到Redis"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self._last_sync = time.time()
+        if not pending:
+            return
+        r = get_redis_connection()
+        try:
+            if not r:
+                raise redis.ConnectionError("无可用连接")
+            self._redis_add(r, pending)
+        except Exception as e:
+            logging.error(f"标记URL失败: {str(e)}")
+            # 同步失败的URL放回待同步列表，下次重试
+            with self._lock:
+                self._pending[:0] = pending
+    
+    def push_many(self, urls):
+        """把整批URL推入队列，返回推入的数量"""
+        urls = list(urls)
+        if not urls:
+            return 0
+        r = get_redis_connection()
+        if not r:
+            return 0
+        
+        try:
+            pipe = r.pipeline(transaction=False)
+            if CRAWL_SETTINGS['reliable_queue']:
+                for url in urls:
+                    pipe.xadd(self.STREAM_KEY, {'url': url})
+            else:
+                for chunk in self._chunks(urls):
+                    pipe.lpush(self.QUEUE_KEY, *chunk)
+            pipe.execute()
+            return len(urls)
+        except Exception as e:
+            logging.error(f"添加URL到队列失败: {str(e)}")
+            return 0
+    
+    def pop_many(self, count, block=None):
+        """从队列取出最多count个URL
+        
+        block为队列空时阻塞等待的秒数（None使用queue_block_timeout，0不阻塞）。
+        可靠队列模式下取出的URL处于租约中，处理完成后需调用ack_many确认。
+        """
+        if block is None:
+            block = CRAWL_SETTINGS['queue_block_timeout']
+        r = get_redis_connection()
+        if not r:
+            return []
+        
+        try:
+            if CRAWL_SETTINGS['reliable_queue']:
+                return self._claim(r, count, block)
+            
+            try:
+                urls = r.rpop(self.QUEUE_KEY, count)
+            except redis.ResponseError:
+                # Redis 6.2以前的RPOP不支持count，用事务取出队尾count个元素
+                pipe = r.pipeline(transaction=True)
+                pipe.lrange(self.QUEUE_KEY, -count, -1)
+                pipe.ltrim(self.QUEUE_KEY, 0, -count - 1)
+                urls = list(reversed(pipe.execute()[0]))
+            if not urls and block:
+                # 队列为空时阻塞等待，避免空闲工作者轮询
+                item = r.brpop(self.QUEUE_KEY, timeout=block)
+                urls = [item[1]] if item else []
+            urls = urls or []
+            return [url for url, ok in zip(urls, self._reserve_many(r, urls)) if ok]
+        except Exception as e:
+            logging.error(f"从队列获取URL失败: {str(e)}")
+            return []
+    
+    def _claim(self, r, count, block):
+        """可靠队列：先回收租约过期的消息，再读取新消息"""
+        self._ensure_group(r)
+        lease_ms = int(CRAWL_SETTINGS['queue_lease_timeout'] * 1000)
+        
+        # 其他工作者崩溃或超时未确认的消息，转给当前消费者
+        reclaimed = r.xautoclaim(
+            self.STREAM_KEY, self.GROUP_NAME, self.consumer,
+            min_idle_time=lease_ms, start_id='0-0', count=count
+        )
+        messages = [m for m in reclaimed[1] if m and m[1]]
+        if messages:
+            logging.warning(f"回收了 {len(messages)} 个租约过期的URL")
+            messages = self._drop_poison(r, messages)
+            # 回收的消息是原处理者放弃的，直接续占处理标记
+            self._reserve_many(r, [fields.get('url', '') for _, fields in messages], force=True)
+        
+        if len(messages) < count:
+            response = r.xreadgroup(
+                self.GROUP_NAME, self.consumer, {self.STREAM_KEY: '>'},
+                count=count - len(messages),
+                block=int(block * 1000) if block and not messages else None
+            )
+            entries = [m for _, batch in response or [] for m in batch]
+            reserved = self._reserve_many(r, [fields.get('url', '') for _, fields in entries])
+            duplicates = [message_id for (message_id, _), ok in zip(entries, reserved) if not ok]
+            if duplicates:
+                # 同一URL已在其他工作者或线程中处理，确认并删除重复消息，不再抓取
+                pipe = r.pipeline(transaction=False)
+                pipe.xack(self.STREAM_KEY, self.GROUP_NAME, *duplicates)
+                pipe.xdel(self.STREAM_KEY, *duplicates)
+                pipe.execute()
+                logging.info(f"丢弃了 {len(duplicates)} 个正在处理中的重复URL")
+            messages.extend(m for m, ok in zip(entries, reserved) if ok)
+        
+        urls = []
+        with self._lock:
+            for message_id, fields in messages:
+                url = fields.get('url')
+                if url:
+                    self._leases.setdefault(url, []).append(message_id)
+                    urls.append(url)
+        return urls
+    
+    def _drop_poison(self, r, messages):
+        """把分发次数超过上限的消息移入死信流并确认删除，返回其余消息"""
+        pipe = r.pipeline(transaction=False)
+        for message_id, _ in messages:
+            pipe.xpending_range(self.STREAM_KEY, self.GROUP_NAME, min=message_id, max=message_id, count=1)
+        
+        limit = CRAWL_SETTINGS['queue_max_deliveries']
+        alive, dead = [], []
+        for message, pending in zip(messages, pipe.execute()):
+            deliveries = pending[0]['times_delivered'] if pending else 0
+            if limit and deliveries > limit:
+                dead.append((message, deliveries))
+            else:
+                alive.append(message)
+        
+        if dead:
+            pipe = r.pipeline(transaction=False)
+            for (message_id, fields), deliveries in dead:
+                pipe.xadd(self.DEAD_KEY, {'url': fields.get('url', ''), 'deliveries': deliveries},
+                          maxlen=self.DEAD_MAXLEN, approximate=True)
+            ids = [message_id for (message_id, _), _ in dead]
+            pipe.xack(self.STREAM_KEY, self.GROUP_NAME, *ids)
+            pipe.xdel(self.STREAM_KEY, *ids)
+            pipe.execute()
+            with self._lock:
+                for (message_id, fields), _ in dead:
+                    ids = self._leases.get(fields.get('url'))
+                    if ids and message_id in ids:
+                        ids.remove(message_id)
+                        if not ids:
+                            del self._leases[fields['url']]
+            logging.warning(f"{len(dead)} 个URL分发超过 {limit} 次仍未完成，已移入死信流 {self.DEAD_KEY}")
+        return alive
+    
+    def _claim_key(self, url):
+        return self.CLAIM_PREFIX + hashlib.blake2b(url.encode('utf-8'), digest_size=16).hexdigest()
+    
+    def _reserve_many(self, r, urls, force=False):
+        """为取出的URL占用处理标记，返回与urls等长的布尔列表（False表示该URL正在别处处理）
+        
+        push_new只能过滤已爬取的URL，已入队或正在抓取的URL仍可能重复入队；
+        标记在queue_lease_timeout后过期，期间URL抓取完成会记入去重集合。
+        force为True时无条件续占（回收的过期租约）。
+        """
+        if not urls or not CRAWL_SETTINGS['use_bloom_filter']:
+            return [True] * len(urls)
+        ttl = max(1, int(math.ceil(CRAWL_SETTINGS['queue_lease_timeout'])))
+        pipe = r.pipeline(transaction=False)
+        for url in urls:
+            pipe.set(self._claim_key(url), self.consumer, nx=not force, ex=ttl)
+        return [bool(ok) for ok in pipe.execute()]
+    
+    def release_many(self, urls):
+        """放弃本进程持有的租约但不确认：消息留在待处理列表中，租约超时后重新分发（计入分发次数）"""
+        urls = list(urls)
+        with self._lock:
+            for url in urls:
+                self._leases.pop(url, None)
+        if not urls or not CRAWL_SETTINGS['use_bloom_filter']:
+            return
+        # 解除处理标记，重复入队的同一URL可以被其他工作者取走
+        r = get_redis_connection()
+        if not r:
+            return
+        try:
+            r.delete(*(self._claim_key(url) for url in urls))
+        except Exception as e:
+            logging.error(f"释放URL失败: {str(e)}")
+    
+    def ack_many(self, urls):
+        """确认URL已处理完成，从流中删除；非可靠队列模式下无操作"""
+        with self._lock:
+            ids = [message_id for url in dict.fromkeys(urls)
+                   for message_id in self._leases.pop(url, ())]
+        if not ids:
+            return
+        r = get_redis_connection()
+        if not r:
+            return
+        
+        try:
+            pipe = r.pipeline(transaction=False)
+            for chunk in self._chunks(ids):
+                pipe.xack(self.STREAM_KEY, self.GROUP_NAME, *chunk)
+                pipe.xdel(self.STREAM_KEY, *chunk)
+            pipe.execute()
+        except Exception as e:
+            logging.error(f"确认URL失败: {str(e)}")
+    
+    def push_new(self, urls):
+        """只把未爬取过的URL推入队列（一次批量去重 + 一次批量推入），返回推入的数量
+        
+        已入队但尚未爬取的URL仍会重复推入，由pop_many取出时的处理标记丢弃。
+        """
+        urls = list(dict.fromkeys(urls))
+        if CRAWL_SETTINGS['use_bloom_filter']:
+            urls = [url for url, seen in zip(urls, self.seen_many(urls)) if not seen]
+        return self.push_many(urls)
+
+REDIS_FRONTIER = RedisFrontier()
+atexit.register(REDIS_FRONTIER.flush)
+
 def url_seen(url):
     """检查URL是否已爬取（使用Redis Bloom Filter）"""
     if not CRAWL_SETTINGS['use_bloom_filter'] or not CRAWL_SETTINGS['use_distributed']:
         return False
-    
-    r = get_redis_connection()
-    if not r:
-        return False
-    
-    try:
-        return r.execute_command('BF.EXISTS', 'urls:bloom', url) == 1
-    except:
-        # 如果Bloom Filter不可用，使用普通集合
-        return r.sismember('urls:seen', url)
+    return REDIS_FRONTIER.seen_many([url])[0]
 
 def mark_url_seen(url):
     """标记URL为已爬取"""
     if not CRAWL_SETTINGS['use_bloom_filter'] or not CRAWL_SETTINGS['use_distributed']:
         return
-    
-    r = get_redis_connection()
-    if not r:
-        return
-    
-    try:
-        r.execute_command('BF.ADD', 'urls:bloom', url)
-    except:
-        # 如果Bloom Filter不可用，使用普通集合
-        r.sadd('urls:seen', url)
+    REDIS_FRONTIER.mark_many([url])
 
 def add_url_to_queue(url):
     """添加URL到Redis队列"""
     if not CRAWL_SETTINGS['use_distributed']:
         return
-    
-    r = get_redis_connection()
-    if not r:
-        return
-    
-    try:
-        r.lpush('spider:start_urls', url)
-    except Exception as e:
-        logging.error(f"添加URL到队列失败: {str(e)}")
+    REDIS_FRONTIER.push_many([url])
+
+def add_urls_to_queue(urls):
+    """批量添加URL到Redis队列（跳过已爬取的URL），返回实际添加的数量"""
+    if not CRAWL_SETTINGS['use_distributed']:
+        return 0
+    return REDIS_FRONTIER.push_new(urls)
 
-def get_url_from_queue():
+def get_url_from_queue(block=None):
     """从Redis队列获取URL"""
     if not CRAWL_SETTINGS['use_distributed']:
         return None
-    
-    r = get_redis_connection()
-    if not r:
-        return None
-    
-    try:
-        return r.rpop('spider:start_urls')
-    except Exception as e:
-        logging.error(f"从队列获取URL失败: {str(e)}")
-        return None
+    urls = REDIS_FRONTIER.pop_many(1, block)
+    return urls[0] if urls else None
+
+def get_urls_from_queue(count, block=None):
+    """从Redis队列批量获取URL"""
+    if not CRAWL_SETTINGS['use_distributed']:
+        return []
+    return REDIS_FRONTIER.pop_many(count, block)
+
+def ack_urls(urls):
+    """确认队列中取出的URL已处理完成（可靠队列模式）"""
+    if not CRAWL_SETTINGS['use_distributed']:
+        return
+    REDIS_FRONTIER.ack_many(urls)
+
+def release_urls(urls):
+    """放弃队列中取出的URL的租约，超时后重新分发（可靠队列模式）"""
+    if not CRAWL_SETTINGS['use_distributed']:
+        return
+    REDIS_FRONTIER.release_many(urls)
 
 def simulate_behavior(page):
     """模拟人类行为模式"""
@@ -310,95 +1437,285 @@ def simulate_behavior(page):
     except Exception as e:
         logging.warning(f"行为模拟失败: {str(e)}")
 
+def create_chrome_driver(proxy=None):
+    """启动一个隐藏自动化特征的无头Chrome"""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    
+    options = Options()
+    options.add_argument("--headless")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    options.add_argument(f"user-agent={get_random_ua()}")
+    
+    # 禁用自动化控制标志
+    options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    options.add_experimental_option('useAutomationExtension', False)
+    
+    # 设置更自然的浏览器指纹
+    caps = DesiredCapabilities.CHROME
+    caps['goog:loggingPrefs'] = {'performance': 'ALL'}
+    
+    # 添加代理设置
+    if proxy:
+        options.add_argument(f'--proxy-server={proxy}')
+    
+    driver = webdriver.Chrome(options=options, desired_capabilities=caps)
+    
+    # 隐藏自动化特征（对之后打开的每个页面都生效）
+    driver.execute_cdp_cmd(
+        "Page.addScriptToEvaluateOnNewDocument",
+        {"source": "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})"}
+    )
+    driver.set_page_load_timeout(30)
+    return driver
+
+class BrowserPool:
+    """常驻的无头浏览器池
+    
+    浏览器启动一次后在多个页面间复用，最多browser_pool_size个实例并行渲染；
+    每个实例渲染browser_max_pages个页面、崩溃或所用代理不再可用（被移出列表或隔离）后会被关闭并重建；
+    空闲实例的代理仍可用时直接复用，只在新建实例时从代理池选择代理。
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._idle = []
+        self._semaphore = None
+        self._size = 0
+    
+    def _get_semaphore(self):
+        with self._lock:
+            size = max(1, CRAWL_SETTINGS['browser_pool_size'])
+            if self._semaphore is None or self._size != size:
+                # 池大小变化时换新的信号量，已借出的浏览器仍归还到旧信号量
+                self._semaphore = threading.BoundedSemaphore(size)
+                self._size = size
+            return self._semaphore
+    
+    def acquire(self):
+        """借出一个浏览器，池满时阻塞等待"""
+        semaphore = self._get_semaphore()
+        semaphore.acquire()
+        try:
+            lease = None
+            stale = []
+            with self._lock:
+                while self._idle:
+                    candidate = self._idle.pop()
+                    if proxy_usable(candidate['proxy']):
+                        lease = candidate
+                        break
+                    stale.append(candidate)
+            for candidate in stale:
+                self._quit(candidate)
+            if lease is None:
+                proxy = get_current_proxy()
+                lease = {'driver': create_chrome_driver(proxy), 'proxy': proxy, 'pages': 0}
+                logging.info("已启动新的浏览器实例")
+        except Exception:
+            semaphore.release()
+            raise
+        lease['semaphore'] = semaphore
+        lease['broken'] = False
+        return lease
+    
+    def release(self, lease):
+        """归还浏览器，达到页面上限或已损坏的实例直接关闭"""
+        semaphore = lease.pop('semaphore')
+        try:
+            lease['pages'] += 1
+            if lease['broken'] or lease['pages'] >= CRAWL_SETTINGS['browser_max_pages']:
+                self._quit(lease)
+                return
+            try:
+                # 清空当前页面，释放内存并停止页面中的脚本
+                lease['driver'].get("about:blank")
+            except Exception:
+                self._quit(lease)
+                return
+            with self._lock:
+                self._idle.append(lease)
+        finally:
+            semaphore.release()
+    
+    @contextlib.contextmanager
+    def browser(self):
+        lease = self.acquire()
+        try:
+            yield lease['driver']
+        except Exception:
+            lease['broken'] = True
+            raise
+        finally:
+            self.release(lease)
+    
+    def _quit(self, lease):
+        try:
+            lease['driver'].quit()
+        except Exception:
+            pass
+    
+    def shutdown(self):
+        """关闭所有空闲浏览器"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for lease in idle:
+            self._quit(lease)
+
+BROWSER_POOL = BrowserPool()
+atexit.register(BROWSER_POOL.shutdown)
+
+# 快速渲染时各资源类型对应的拦截URL模式
+RENDER_BLOCK_PATTERNS = {
+    'image': ['*.png*', '*.jpg*', '*.jpeg*', '*.gif*', '*.webp*', '*.svg*', '*.ico*', '*.bmp*', '*.avif*'],
+    'font': ['*.woff*', '*.ttf*', '*.otf*', '*.eot*'],
+    'media': ['*.mp4*', '*.webm*', '*.mp3*', '*.ogg*', '*.wav*', '*.m3u8*', '*.flv*'],
+    'stylesheet': ['*.css*'],
+}
+
+def set_render_blocking(driver, enabled):
+    """通过CDP拦截指定类型和域名的资源请求（只影响加载，DOM中的<img>地址仍然保留）"""
+    patterns = []
+    if enabled:
+        for resource_type in CRAWL_SETTINGS['render_block_resources']:
+            patterns.extend(RENDER_BLOCK_PATTERNS.get(resource_type, []))
+        for domain in CRAWL_SETTINGS['render_block_domains']:
+            patterns.append(f"*{domain}*")
+    driver.execute_cdp_cmd('Network.enable', {})
+    driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+
+def wait_for_network_idle(driver, idle_ms, deadline):
+    """等待DOM解析完成且idle_ms毫秒内没有新资源请求，最迟到deadline为止"""
+    last_count = -1
+    idle_since = time.time()
+    while time.time() < deadline:
+        state, count = driver.execute_script(
+            "return [document.readyState, performance.getEntriesByType('resource').length]"
+        )
+        now = time.time()
+        if count != last_count or state == 'loading':
+            last_count = count
+            idle_since = now
+        elif (now - idle_since) * 1000 >= idle_ms:
+            return True
+        time.sleep(0.1)
+    return False
+
 def render_dynamic_page(url):
     try:
-        from selenium import webdriver
-        from selenium.webdriver.chrome.options import Options
         from selenium.webdriver.common.by import By
         from selenium.webdriver.support.ui import WebDriverWait
-        from selenium.webdriver.support import expected_conditions as EC
-        from selenium.common.exceptions import TimeoutException, WebDriverException
+        from selenium.common.exceptions import TimeoutException
     except ImportError:
         logging.error("未安装Selenium，无法使用动态渲染")
         return None
     
+    fast = CRAWL_SETTINGS['fast_render']
+    
     try:
-        options = Options()
-        options.add_argument("--headless")
-        options.add_argument("--disable-gpu")
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-dev-shm-usage")
-        options.add_argument("--disable-blink-features=AutomationControlled")
-        options.add_argument(f"user-agent={get_random_ua()}")
-        
-        # 禁用自动化控制标志
-        options.add_experimental_option("excludeSwitches", ["enable-automation"])
-        options.add_experimental_option('useAutomationExtension', False)
-        
-        # 设置更自然的浏览器指纹
-        caps = DesiredCapabilities.CHROME
-        caps['goog:loggingPrefs'] = {'performance': 'ALL'}
-        
-        # 添加代理设置
-        if CRAWL_SETTINGS['use_proxy']:
-            proxy = get_current_proxy()
-            if proxy:
-                options.add_argument(f'--proxy-server={proxy}')
-        
-        driver = webdriver.Chrome(options=options, desired_capabilities=caps)
-        
-        # 隐藏自动化特征
-        driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
-        
-        driver.set_page_load_timeout(30)
-        driver.get(url)
-        
-        try:
-            WebDriverWait(driver, 20).until(
-                lambda d: d.execute_script('return document.readyState') == 'complete'
-            )
-        except TimeoutException:
-            logging.warning("页面加载超时，继续处理已加载内容")
-        
-        # 模拟人类行为
-        if CRAWL_SETTINGS['behavior_simulation']:
-            # 随机移动鼠标
-            width = driver.execute_script("return document.body.scrollWidth")
-            height = driver.execute_script("return document.body.scrollHeight")
+        with BROWSER_POOL.browser() as driver:
+            # 复用的浏览器每次都要重新设置拦截规则和超时
+            set_render_blocking(driver, fast)
+            
+            if fast:
+                # 快速模式：整页时间预算内尽量拿到DOM，超时即停止加载
+                deadline = time.time() + CRAWL_SETTINGS['render_time_budget']
+                driver.set_page_load_timeout(CRAWL_SETTINGS['render_time_budget'])
+                try:
+                    driver.get(url)
+                except TimeoutException:
+                    driver.execute_script("window.stop()")
+                    logging.warning("快速渲染超出时间预算，使用已加载内容")
+                
+                wait_deadline = min(deadline, time.time() + CRAWL_SETTINGS['render_wait_ms'] / 1000)
+                if not wait_for_network_idle(driver, CRAWL_SETTINGS['render_idle_ms'], wait_deadline):
+                    logging.info("等待网络空闲超时，继续处理已加载内容")
+                return driver.page_source
+            
+            driver.set_page_load_timeout(30)
+            driver.get(url)
             
-            # 生成随机轨迹
-            num_movements = random.randint(5, 15)
-            for i in range(num_movements):
-                x = random.randint(0, width)
-                y = random.randint(0, height)
-                driver.execute_script(f"document.elementFromPoint({x}, {y}).scrollIntoView()")
-                time.sleep(random.uniform(0.1, 0.5))
+            try:
+                WebDriverWait(driver, 20).until(
+                    lambda d: d.execute_script('return document.readyState') == 'complete'
+                )
+            except TimeoutException:
+                logging.warning("页面加载超时，继续处理已加载内容")
             
-            # 随机滚动
-            for _ in range(random.randint(3, 8)):
-                scroll_y = random.randint(200, 800)
-                driver.execute_script(f"window.scrollBy(0, {scroll_y})")
-                time.sleep(random.uniform(0.2, 1.0))
+            # 模拟人类行为
+            if CRAWL_SETTINGS['behavior_simulation']:
+                # 随机移动鼠标
+                width = driver.execute_script("return document.body.scrollWidth")
+                height = driver.execute_script("return document.body.scrollHeight")
                 
-            # 随机点击
-            if random.random() < 0.3:
-                elements = driver.find_elements(By.XPATH, "//a | //button")
-                if elements:
-                    random.choice(elements).click()
-                    time.sleep(random.uniform(0.5, 1.5))
-        
-        content = driver.page_source
-        driver.quit()
-        return content
+                # 生成随机轨迹
+                num_movements = random.randint(5, 15)
+                for i in range(num_movements):
+                    x = random.randint(0, width)
+                    y = random.randint(0, height)
+                    driver.execute_script(f"document.elementFromPoint({x}, {y}).scrollIntoView()")
+                    time.sleep(random.uniform(0.1, 0.5))
+                
+                # 随机滚动
+                for _ in range(random.randint(3, 8)):
+                    scroll_y = random.randint(200, 800)
+                    driver.execute_script(f"window.scrollBy(0, {scroll_y})")
+                    time.sleep(random.uniform(0.2, 1.0))
+                    
+                # 随机点击
+                if random.random() < 0.3:
+                    elements = driver.find_elements(By.XPATH, "//a | //button")
+                    if elements:
+                        random.choice(elements).click()
+                        time.sleep(random.uniform(0.5, 1.5))
+            
+            return driver.page_source
     except Exception as e:
         logging.error(f"动态渲染失败: {str(e)}")
-        try:
-            driver.quit()
-        except:
-            pass
         return None
 
+class ParsedDocument:
+    """每个响应只解析一次的HTML文档，图片发现、链接提取和正文提取共用同一棵lxml树
+    
+    使用selectolax后端时，另外按需构建一棵Lexbor树（同样只解析一次）
+    """
+    def __init__(self, html_text, url):
+        self.html = html_text
+        self.url = url
+        self._lexbor = None
+        try:
+            self.tree = document_fromstring(html_text)
+        except ValueError:
+            # 带编码声明的XML文档不能以str形式解析
+            self.tree = document_fromstring(html_text.encode('utf-8'))
+    
+    def xpath(self, expr):
+        return self.tree.xpath(expr)
+    
+    @property
+    def lexbor(self):
+        if self._lexbor is None:
+            self._lexbor = LexborHTMLParser(self.html)
+        return self._lexbor
+
+# 正文文本中不应包含的节点
+TEXT_XPATH = './/text()[not(ancestor::script) and not(ancestor::style) and not(ancestor::noscript)]'
+
+def node_text(element, separator=''):
+    """提取节点文本，每段去除首尾空白后用separator连接（等同于BeautifulSoup的get_text(separator, strip=True)）"""
+    return separator.join(t.strip() for t in element.xpath(TEXT_XPATH) if t.strip())
+
 def find_image_resources(soup, base_url):
+    """查找页面中的图片资源
+    
+    soup为ParsedDocument时使用parser_backend设置的快速后端，
+    为BeautifulSoup对象时使用下面的逐项find_all实现（作为结果比对的基准）
+    """
+    if isinstance(soup, ParsedDocument):
+        return discover_resources(soup, base_url)[0]
+    
     image_links = set()
     
     for img in soup.find_all('img', src=True):
@@ -446,18 +1763,107 @@ def find_image_resources(soup, base_url):
     
     return list(image_links)
 
-def extract_links(soup, base_url, max_depth):
+# 单次遍历时需要的节点：链接、图片、内联样式、图标、OG图片
+SELECTOLAX_RESOURCE_CSS = "a[href], img[src], link[href], meta[property='og:image'], [style]"
+ICON_RELS = {'icon', 'apple-touch-icon'}
+
+def empty_scan():
+    return {'img': [], 'style': [], 'icon': [], 'og': [], 'href': []}
+
+def scan_resources_bs4(soup):
+    """BeautifulSoup后端：收集原始属性值"""
+    found = empty_scan()
+    found['img'] = [img['src'] for img in soup.find_all('img', src=True)]
+    found['style'] = [element['style'] for element in soup.find_all(style=True)]
+    found['icon'] = [link['href'] for link in soup.find_all('link', rel=['icon', 'apple-touch-icon', 'shortcut icon'], href=True)]
+    found['og'] = [meta['content'] for meta in soup.find_all('meta', attrs={'property': 'og:image', 'content': True})]
+    found['href'] = [a['href'] for a in soup.find_all('a', href=True)]
+    return found
+
+def scan_resources_lxml(tree):
+    """lxml后端：对整棵树只遍历一次，按标签和属性分类收集"""
+    found = empty_scan()
+    for element in tree.iter(tag=etree.Element):
+        attrib = element.attrib
+        if not attrib:
+            continue
+        tag = element.tag
+        if tag == 'a':
+            if 'href' in attrib:
+                found['href'].append(attrib['href'])
+        elif tag == 'img':
+            if 'src' in attrib:
+                found['img'].append(attrib['src'])
+        elif tag == 'link':
+            if 'href' in attrib and ICON_RELS.intersection(attrib.get('rel', '').split()):
+                found['icon'].append(attrib['href'])
+        elif tag == 'meta':
+            if attrib.get('property') == 'og:image' and 'content' in attrib:
+                found['og'].append(attrib['content'])
+        if 'style' in attrib:
+            found['style'].append(attrib['style'])
+    return found
+
+def scan_resources_selectolax(parser):
+    """selectolax后端：一次CSS匹配在C层完成遍历"""
+    found = empty_scan()
+    for node in parser.css(SELECTOLAX_RESOURCE_CSS):
+        attrs = node.attributes
+        tag = node.tag
+        # [style]也会匹配到没有href/src的a、img等标签，逐一检查属性
+        if tag == 'a':
+            if 'href' in attrs:
+                found['href'].append(attrs['href'] or '')
+        elif tag == 'img':
+            if 'src' in attrs:
+                found['img'].append(attrs['src'] or '')
+        elif tag == 'link':
+            if ICON_RELS.intersection((attrs.get('rel') or '').split()) and 'href' in attrs:
+                found['icon'].append(attrs['href'] or '')
+        elif tag == 'meta':
+            if attrs.get('property') == 'og:image' and 'content' in attrs:
+                found['og'].append(attrs['content'] or '')
+        if 'style' in attrs:
+            found['style'].append(attrs['style'] or '')
+    return found
+
+def resolve_image_urls(found, base_url):
+    """把原始属性值转换成去重后的绝对图片URL（规则与find_image_resources一致）"""
+    image_links = set()
+    candidates = dict.fromkeys(v.strip() for v in found['img'] + found['icon'] + found['og'])
+    
+    for src in candidates:
+        if src and not src.lower().startswith('data:'):
+            try:
+                image_links.add(urlparse.urljoin(base_url, src))
+            except:
+                continue
+    
+    # 检查CSS背景图
+    for style in dict.fromkeys(found['style']):
+        for url in re.findall(r'url\(["\']?(.*?)["\']?\)', style, re.IGNORECASE):
+            if url.startswith('data:'):
+                continue
+            try:
+                image_links.add(urlparse.urljoin(base_url, url))
+            except:
+                continue
+    
+    return list(image_links)
+
+def filter_links(hrefs, base_url):
+    """过滤出同域的页面链接"""
     links = set()
     parsed_base = urlparse.urlparse(base_url)
     
-    for a in soup.find_all('a', href=True):
-        href = a['href']
+    # 先去重，导航栏等处的重复链接只处理一次
+    for href in dict.fromkeys(hrefs):
         if not href or href.startswith(('#', 'javascript:', 'mailto:')):
             continue
         
         try:
             full_url = urlparse.urljoin(base_url, href)
-            parsed = urlparse.urlparse(full_url)
+            parsed = urlparse.urlsplit(full_url)
             
             # 只保留http/https链接
             if parsed.scheme not in ['http', 'https']:
@@ -473,143 +1879,1576 @@ def extract_links(soup, base_url, max_depth):
         except:
             continue
     
-    return list(links)[:10 * max_depth]
+    return links
+
+def scan_resources(doc, backend=None):
+    """用指定后端扫描文档，返回原始属性值"""
+    if backend is None:
+        backend = CRAWL_SETTINGS['parser_backend']
+    if backend == 'selectolax':
+        if LexborHTMLParser is not None:
+            return scan_resources_selectolax(doc.lexbor)
+        logging.warning("未安装selectolax，改用lxml解析后端")
+    elif backend == 'bs4':
+        return scan_resources_bs4(BeautifulSoup(doc.html, 'lxml'))
+    return scan_resources_lxml(doc.tree)
+
+def discover_resources(doc, base_url, backend=None):
+    """一次扫描同时得到 (图片列表, 同域链接列表)"""
+    found = scan_resources(doc, backend)
+    return resolve_image_urls(found, base_url), list(filter_links(found['href'], base_url))
+
+def extract_links(soup, base_url, max_depth):
+    """提取同域链接，soup可以是ParsedDocument或BeautifulSoup对象"""
+    if isinstance(soup, ParsedDocument):
+        hrefs = scan_resources(soup)['href']
+    else:
+        hrefs = [a['href'] for a in soup.find_all('a', href=True)]
+    links = filter_links(hrefs, base_url)
+    
+    # max_depth为None时返回全部链接（供爬取引擎使用）
+    if max_depth is None:
+        return list(links)
+    return list(links)[:10 * max_depth]
+
+def benchmark_parsers(html_text=None, base_url='http://example.com/', rounds=5):
+    """比较各解析后端从原始HTML到属性扫描完成的耗时，并校验图片/链接结果与BeautifulSoup基准一致
+    
+    未提供html_text时生成一个约1.3MB的测试页面。返回 {后端: 平均毫秒数}
+    """
+    if html_text is None:
+        blocks = []
+        for i in range(3000):
+            blocks.append(
+                f'<div class="item" style="background:url(/bg/{i}.png)"><!-- 第{i}项 --><p>段落 {i} ' + '文字 ' * 40 +
+                f'<a href="/page/{i}">链接{i}</a> <a href="/page/{i}#top">锚点</a> '
+                f'<a href="http://other.com/{i}">外链</a></p>'
+                f'<img src="/img/{i}.jpg" alt="{i}"></div>'
+            )
+        # 带style但没有src/href的标签、非og:image的meta，各后端都不应收集
+        html_text = (
+            '<html><head><link rel="shortcut icon" href="/favicon.ico">'
+            '<meta property="og:image" content="/og.jpg">'
+            '<meta name="theme" style="display:none" content="/not-og.jpg"></head><body>'
+            '<img style="border:0" data-src="/lazy.jpg"><a style="color:red">无链接</a>'
+            + ''.join(blocks) + '</body></html>'
+        )
+    
+    reference_soup = BeautifulSoup(html_text, 'lxml')
+    expected_images = set(find_image_resources(reference_soup, base_url))
+    expected_links = set(extract_links(reference_soup, base_url, None))
+    
+    backends = {
+        'bs4': lambda: scan_resources_bs4(BeautifulSoup(html_text, 'lxml')),
+        'lxml': lambda: scan_resources_lxml(document_fromstring(html_text)),
+    }
+    if LexborHTMLParser is not None:
+        backends['selectolax'] = lambda: scan_resources_selectolax(LexborHTMLParser(html_text))
+    
+    results = {}
+    for backend, run in backends.items():
+        start_time = time.perf_counter()
+        for _ in range(rounds):
+            found = run()
+        results[backend] = (time.perf_counter() - start_time) / rounds * 1000
+        
+        if (set(resolve_image_urls(found, base_url)) != expected_images
+                or filter_links(found['href'], base_url) != expected_links):
+            logging.warning(f"解析后端{backend}的结果与基准不一致")
+            print(f"警告: 解析后端{backend}的结果与基准不一致")
+    
+    # URL规范化对所有后端相同，单独计时
+    start_time = time.perf_counter()
+    resolve_image_urls(found, base_url)
+    filter_links(found['href'], base_url)
+    resolve_ms = (time.perf_counter() - start_time) * 1000
+    
+    # 启发式正文计分（测试页面含注释，同时检查其不影响计分）
+    start_time = time.perf_counter()
+    content_blocks = score_content_blocks(document_fromstring(html_text))
+    heuristic_ms = (time.perf_counter() - start_time) * 1000
+    if not content_blocks:
+        logging.warning("启发式正文计分未找到正文块")
+        print("警告: 启发式正文计分未找到正文块")
+    
+    size_mb = len(html_text.encode('utf-8')) / (1024 * 1024)
+    print(f"页面大小: {size_mb:.2f}MB, 每个后端运行 {rounds} 次取平均")
+    for backend, elapsed in results.items():
+        print(f"{backend:<12}{elapsed:>10.1f} ms  (x{results['bs4'] / elapsed:.1f})")
+    print(f"{'URL规范化':<12}{resolve_ms:>10.1f} ms  (各后端共用)")
+    print(f"{'启发式正文':<12}{heuristic_ms:>10.1f} ms  ({len(content_blocks)} 个正文块)")
+    return results
+
+# 子进程解析时需要同步的设置项
+PARSE_SETTING_KEYS = (
+    'image_crawling',
+    'text_crawling',
+    'parser_backend',
+    'ai_content_extraction',
+    'content_selector_failures',
+    'template_learning',
+    'template_min_pages',
+    'template_min_confidence',
+    'template_file',
+    'anomaly_detection',
+    'anomaly_model_file',
+    'anomaly_threshold',
+)
+
+def parse_page(url, content, want_links=False, settings=None):
+    """解析HTML并提取图片、链接和正文，返回 (文本, 图片列表, 链接列表, 错误信息)
+    
+    纯CPU工作，不访问网络和Redis，可在解析子进程中执行；settings为主进程的当前设置。
+    """
+    if settings is not None:
+        CRAWL_SETTINGS.update(settings)
+    
+    image_resources = []
+    try:
+        # 只解析一次，后续各阶段共用
+        doc = ParsedDocument(content, url)
+    except Exception as e:
+        return None, [], [], f"解析失败: {str(e)}"
+    
+    # 一次扫描同时得到图片和链接
+    page_links = []
+    if CRAWL_SETTINGS['image_crawling'] or want_links:
+        image_resources, page_links = discover_resources(doc, url)
+        if not CRAWL_SETTINGS['image_crawling']:
+            image_resources = []
+        else:
+            logging.info(f"找到 {len(image_resources)} 张图片")
+    
+    text = ""
+    if CRAWL_SETTINGS['text_crawling']:
+        # 改进的内容提取方法
+        text = extract_main_content(doc, url)
+    
+    return text, image_resources, page_links, None
+
+def finish_page(url, parsed, links_out=None):
+    """在主进程中处理解析结果，返回 (文本, 图片列表, 错误信息)"""
+    text, image_resources, page_links, error = parsed
+    if error:
+        return None, [], error
+    
+    # 收集页面链接（必须在原始HTML上提取，正文文本中已没有<a>标签）
+    if links_out is not None:
+        links_out.extend(page_links)
+    
+    # 标记URL为已爬取（分布式模式）
+    if CRAWL_SETTINGS['use_distributed']:
+        mark_url_seen(url)
+    
+    return text, image_resources, None
+
+def init_parse_worker():
+    """解析子进程初始化：忽略Ctrl+C（由主进程负责停止），预热lxml和Readability"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    warm_up = "<html><body><article><p>warm up</p><a href='/'>a</a></article></body></html>"
+    try:
+        parse_page('http://localhost/', warm_up, True)
+    except Exception:
+        pass
+    if CRAWL_SETTINGS['anomaly_detection']:
+        ANOMALY_DETECTOR.load()
+
+class ParsePool:
+    """解析进程池
+    
+    网络I/O留在线程/asyncio中，HTML解析、正文提取等CPU密集工作交给子进程，绕过GIL随核数扩展。
+    子进程常驻，解析器和模型在进程内保持预热；parse_processes为0时在调用线程内解析。
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._size = 0
+    
+    def _get_executor(self):
+        size = CRAWL_SETTINGS['parse_processes']
+        if size <= 0:
+            return None
+        with self._lock:
+            if self._executor is None or self._size != size:
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False)
+                # spawn避免在多线程的主进程（Tk、抓取线程池）中fork
+                self._executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=size,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=init_parse_worker
+                )
+                self._size = size
+            return self._executor
+    
+    def _submit(self, url, content, want_links):
+        executor = self._get_executor()
+        if executor is None:
+            return None
+        settings = {key: CRAWL_SETTINGS[key] for key in PARSE_SETTING_KEYS}
+        return executor.submit(parse_page, url, content, want_links, settings)
+    
+    def _reset(self, e):
+        logging.error(f"解析进程池异常，改为在当前线程解析: {str(e)}")
+        with self._lock:
+            self._executor = None
+    
+    def parse(self, url, content, want_links=False):
+        future = self._submit(url, content, want_links)
+        if future is None:
+            return parse_page(url, content, want_links)
+        try:
+            return future.result()
+        except concurrent.futures.process.BrokenProcessPool as e:
+            self._reset(e)
+            return parse_page(url, content, want_links)
+    
+    async def parse_async(self, url, content, want_links=False):
+        future = self._submit(url, content, want_links)
+        if future is None:
+            return await asyncio.to_thread(parse_page, url, content, want_links)
+        try:
+            return await asyncio.wrap_future(future)
+        except concurrent.futures.process.BrokenProcessPool as e:
+            self._reset(e)
+            return await asyncio.to_thread(parse_page, url, content, want_links)
+    
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+PARSE_POOL = ParsePool()
+atexit.register(PARSE_POOL.shutdown)
+
+def process_page_content(url, content, links_out=None):
+    """解析已获取的HTML，返回 (文本, 图片列表, 错误信息)"""
+    parsed = PARSE_POOL.parse(url, content, links_out is not None)
+    return finish_page(url, parsed, links_out)
+
+async def async_process_page_content(url, content, links_out=None):
+    """process_page_content的协程版本，解析期间不占用事件循环"""
+    parsed = await PARSE_POOL.parse_async(url, content, links_out is not None)
+    return await asyncio.to_thread(finish_page, url, parsed, links_out)
+
+class FetchStrategyCache:
+    """按域名记录各抓取方式的成功/失败次数和耗时
+    
+    之后对同一域名的请求优先使用上次成功的方式，连续失败的方式排到最后；
+    超过strategy_cache_ttl秒未更新的记录视为过期。
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hosts = {}
+    
+    def _entry(self, host):
+        entry = self._hosts.get(host)
+        if entry is None:
+            if len(self._hosts) >= 10000:
+                self._purge_expired()
+            entry = self._hosts[host] = {'best': None, 'updated': time.time(), 'methods': {}}
+        return entry
+    
+    def _purge_expired(self):
+        deadline = time.time() - CRAWL_SETTINGS['strategy_cache_ttl']
+        for host in [h for h, e in self._hosts.items() if e['updated'] < deadline]:
+            del self._hosts[host]
+    
+    def order(self, host, methods):
+        """返回该域名下各抓取方式的尝试顺序"""
+        with self._lock:
+            entry = self._hosts.get(host)
+            if entry is None:
+                return list(methods)
+            if time.time() - entry['updated'] > CRAWL_SETTINGS['strategy_cache_ttl']:
+                del self._hosts[host]
+                return list(methods)
+            
+            threshold = CRAWL_SETTINGS['strategy_failure_threshold']
+            
+            def rank(method):
+                if method == entry['best']:
+                    return (0, 0)
+                stats = entry['methods'].get(method)
+                failing = stats is not None and stats['consecutive_failures'] >= threshold
+                return (2 if failing else 1, methods.index(method))
+            
+            return sorted(methods, key=rank)
+    
+    def record_success(self, host, method, latency):
+        with self._lock:
+            entry = self._entry(host)
+            stats = entry['methods'].setdefault(method, {'success': 0, 'failures': 0, 'consecutive_failures': 0, 'latency': latency})
+            stats['success'] += 1
+            stats['consecutive_failures'] = 0
+            # 指数移动平均耗时
+            stats['latency'] = stats['latency'] * 0.7 + latency * 0.3
+            entry['best'] = method
+            entry['updated'] = time.time()
+    
+    def record_failure(self, host, method):
+        with self._lock:
+            entry = self._entry(host)
+            stats = entry['methods'].setdefault(method, {'success': 0, 'failures': 0, 'consecutive_failures': 0, 'latency': 0.0})
+            stats['failures'] += 1
+            stats['consecutive_failures'] += 1
+            if entry['best'] == method and stats['consecutive_failures'] >= CRAWL_SETTINGS['strategy_failure_threshold']:
+                entry['best'] = None
+            entry['updated'] = time.time()
+    
+    def snapshot(self):
+        """返回当前所有记录的副本（用于日志和调试）"""
+        with self._lock:
+            return json.loads(json.dumps(self._hosts))
+
+STRATEGY_CACHE = FetchStrategyCache()
+
+def enabled_fetch_methods(use_cloudscraper=None):
+    """按默认回退顺序列出当前启用的抓取方式，普通请求始终作为最后手段"""
+    if use_cloudscraper is None:
+        use_cloudscraper = CRAWL_SETTINGS['use_cloudscraper']
+    methods = []
+    if CRAWL_SETTINGS['tls_fingerprint']:
+        methods.append('curl_cffi')
+    if use_cloudscraper:
+        methods.append('cloudscraper')
+    if CRAWL_SETTINGS['dynamic_rendering']:
+        methods.append('dynamic')
+    methods.append('requests')
+    return methods
+
+def fetch_page_with(method, url, headers, proxy, verify):
+    """使用curl_cffi/cloudscraper/动态渲染之一获取页面，返回 (状态码, HTML)
+    
+    HTTP错误返回 (状态码, 响应文本)，由调用方按classify_status决定是否换方式；网络错误返回 (None, None)
+    """
+    proxies = proxy_dict(proxy)
+    try:
+        if method == 'curl_cffi':
+            # 使用curl_cffi绕过TLS指纹检测
+            response = SESSION_POOL.get_curl_session(proxy, "chrome110").get(
+                url,
+                impersonate="chrome110",  # 模拟Chrome指纹
+                headers=headers,
+                proxies=proxies,
+                verify=verify,
+                timeout=CRAWL_SETTINGS['timeout']
+            )
+        elif method == 'cloudscraper':
+            # 尝试使用cloudscraper绕过Cloudflare
+            scraper = SESSION_POOL.get_scraper(proxy)
+            response = scraper.get(url, timeout=CRAWL_SETTINGS['timeout'], proxies=proxies)
+        elif method == 'dynamic':
+            content = render_dynamic_page(url)
+            return (200, content) if content else (None, None)
+        else:
+            return None, None
+        
+        if response.status_code >= 400:
+            logging.warning(f"{method}请求失败: HTTP状态码 {response.status_code}")
+        return response.status_code, response.text
+    except Exception as e:
+        logging.warning(f"{method}请求失败: {str(e)}")
+        return None, None
+
+def decode_response(response):
+    """按声明或探测到的编码解码响应内容"""
+    # 处理编码问题
+    encoding = response.encoding
+    if not encoding or encoding.lower() == 'iso-8859-1':
+        encoding = chardet.detect(response.content)['encoding'] or 'utf-8'
+    try:
+        return response.content.decode(encoding, errors='replace')
+    except LookupError:
+        return response.content.decode('utf-8', errors='replace')
+
+def parse_retry_after(value):
+    """解析Retry-After响应头（秒数或HTTP日期），返回秒数或None"""
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    # 避免异常值让主机长期停摆
+    return min(max(seconds, 0.0), 3600.0)
+
+class HostScheduler:
+    """按主机的礼貌调度器，取代全局的request_delay睡眠
+    
+    每个主机一个令牌桶：按最小间隔补充令牌，并限制同时进行的请求数，只有同一主机的请求相互等待。
+    自适应模式下遇到429/503或Retry-After时间隔翻倍，快速的200响应逐步缩短间隔；
+    robots.txt的Crawl-delay始终是间隔下限。
+    """
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._hosts = {}
+    
+    def _limits(self, host):
+        """返回该主机的 (最小间隔, 并发上限, 令牌桶容量)"""
+        overrides = CRAWL_SETTINGS['host_overrides']
+        override = overrides.get(host) or overrides.get(host.replace('www.', '', 1)) or {}
+        return (
+            override.get('min_delay', CRAWL_SETTINGS['request_delay']),
+            max(1, override.get('concurrency', CRAWL_SETTINGS['host_concurrency'])),
+            max(1, override.get('burst', CRAWL_SETTINGS['host_burst'])),
+        )
+    
+    def _state(self, host, now):
+        state = self._hosts.get(host)
+        if state is None:
+            if len(self._hosts) >= 10000:
+                # 清理空闲的主机记录
+                for h in [h for h, st in self._hosts.items() if not st['active'] and now - st['updated'] > 600]:
+                    del self._hosts[h]
+            state = self._hosts[host] = {
+                'tokens': float(self._limits(host)[2]),
+                'updated': now,
+                'factor': 1.0,
+                'active': 0,
+                'blocked_until': 0.0,
+                'robots_delay': 0.0,
+            }
+        return state
+    
+    def _wait_time(self, host, state, now):
+        """距该主机可以发出下一个请求的秒数；并发已满时返回None"""
+        min_delay, concurrency, burst = self._limits(host)
+        interval = max(min_delay * state['factor'], state['robots_delay'])
+        if interval > 0:
+            state['tokens'] = min(burst, state['tokens'] + (now - state['updated']) / interval)
+        else:
+            state['tokens'] = burst
+        state['updated'] = now
+        
+        if state['active'] >= concurrency:
+            return None
+        wait = max(0.0, state['blocked_until'] - now)
+        if state['tokens'] < 1:
+            wait = max(wait, (1 - state['tokens']) * interval)
+        return wait
+    
+    def _try_acquire(self, url, robots_delay):
+        """尝试占用该主机的一个请求名额，成功返回0，否则返回需要等待的秒数（并发已满为None）"""
+        host = urlparse.urlparse(url).netloc
+        now = time.time()
+        state = self._state(host, now)
+        state['robots_delay'] = robots_delay
+        wait = self._wait_time(host, state, now)
+        if wait == 0:
+            # 每次消耗1~2个令牌，保留原来请求间隔在1~2倍之间随机的效果
+            state['tokens'] -= random.uniform(1, 2)
+            state['active'] += 1
+        return wait
+    
+    def try_acquire(self, url):
+        """不阻塞地占用该URL所在主机的一个请求名额（只使用已缓存的robots.txt间隔）
+        
+        成功返回0，调用方之后必须调用release；否则返回需要等待的秒数（并发已满为None）
+        """
+        robots_delay = ROBOTS_CACHE.cached_crawl_delay(url) if CRAWL_SETTINGS['obey_robots'] else 0.0
+        with self._cond:
+            return self._try_acquire(url, robots_delay)
+    
+    def acquire(self, url):
+        """阻塞直到可以向该URL所在主机发出请求"""
+        robots_delay = ROBOTS_CACHE.crawl_delay(url) if CRAWL_SETTINGS['obey_robots'] else 0.0
+        with self._cond:
+            while True:
+                wait = self._try_acquire(url, robots_delay)
+                if wait == 0:
+                    return
+                self._cond.wait(wait)
+    
+    async def acquire_async(self, url):
+        """acquire的协程版本，等待期间不占用事件循环"""
+        robots_delay = 0.0
+        if CRAWL_SETTINGS['obey_robots']:
+            robots_delay = await asyncio.to_thread(ROBOTS_CACHE.crawl_delay, url)
+        while True:
+            with self._cond:
+                wait = self._try_acquire(url, robots_delay)
+            if wait == 0:
+                return
+            await asyncio.sleep(0.05 if wait is None else wait)
+    
+    def release(self, url, status=None, elapsed=None, retry_after=None):
+        """请求结束后归还名额，并根据响应调整该主机的请求间隔"""
+        host = urlparse.urlparse(url).netloc
+        with self._cond:
+            now = time.time()
+            state = self._state(host, now)
+            state['active'] = max(0, state['active'] - 1)
+            
+            if CRAWL_SETTINGS['adaptive_throttle']:
+                if status in (429, 503) or retry_after:
+                    state['factor'] = min(state['factor'] * 2, 64.0)
+                    state['tokens'] = min(state['tokens'], 0.0)
+                    if retry_after:
+                        state['blocked_until'] = max(state['blocked_until'], now + retry_after)
+                    logging.warning(f"{host} 返回 {status}，请求间隔放大到 {state['factor']:.1f} 倍")
+                elif status == 200 and elapsed is not None and elapsed < CRAWL_SETTINGS['adaptive_fast_response']:
+                    state['factor'] = max(state['factor'] * 0.9, CRAWL_SETTINGS['adaptive_min_factor'])
+            
+            self._cond.notify_all()
+
+HOST_SCHEDULER = HostScheduler()
+
+def pop_ready_url(frontier, scan_limit=64):
+    """从前沿堆中取出优先级最高、且所在主机已可请求的条目，并为其占用该主机的请求名额
+    
+    返回 (条目, 0)，调用方需以reserved=True抓取该条目（抓取结束时归还名额）；
+    没有就绪条目时返回 (None, 最短等待秒数)。最多检查scan_limit个条目，未就绪的条目放回堆中。
+    名额在取出时即被占用，同一主机的后续条目会按其请求间隔排队，不会被重复取出。
+    """
+    deferred = []
+    picked = None
+    shortest = None
+    while frontier and len(deferred) < scan_limit:
+        item = heapq.heappop(frontier)
+        wait = HOST_SCHEDULER.try_acquire(item[2])
+        if wait == 0:
+            picked = item
+            break
+        deferred.append(item)
+        if wait is not None and (shortest is None or wait < shortest):
+            shortest = wait
+    for item in deferred:
+        heapq.heappush(frontier, item)
+    if picked is not None:
+        return picked, 0
+    # 所有主机并发已满时，等到有请求完成
+    return None, 0.05 if shortest is None else shortest
+
+def fetch_web_content(url, links_out=None, reserved=False):
+    """抓取单个页面，返回 (文本, 图片列表, 错误信息)
+    
+    links_out: 可选列表，传入时会把页面中发现的同域链接追加进去
+    reserved: 调用方已通过pop_ready_url占用该主机的请求名额
+    """
+    # 检查URL是否已爬取（分布式模式）
+    if CRAWL_SETTINGS['use_distributed'] and url_seen(url):
+        logging.info(f"URL已爬取: {url}")
+        if reserved:
+            HOST_SCHEDULER.release(url)
+        return None, [], "URL已爬取"
+    
+    # 按主机调度：只等待同一主机的请求间隔和并发名额，下载完成即归还，解析不占名额
+    if not reserved:
+        HOST_SCHEDULER.acquire(url)
+    feedback = {}
+    try:
+        content, error = download_page(url, feedback)
+    finally:
+        HOST_SCHEDULER.release(url, **feedback)
+    
+    if not content:
+        return None, [], error
+    
+    try:
+        return process_page_content(url, content, links_out)
+    except Exception as e:
+        logging.error(f"抓取失败: {str(e)}")
+        return None, [], f"抓取失败: {str(e)}"
+
+# 可重试的响应状态：超时、限流和服务端临时错误；其余4xx视为终态，不再重试
+RETRYABLE_STATUS = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+def classify_status(status_code, text=''):
+    """把响应状态分为 ok / retryable / blocked / terminal"""
+    if status_code == 200:
+        return 'ok'
+    if status_code == 403 and ('cloudflare' in (text or '').lower() or is_ban_response(status_code, text)):
+        # 反爬拦截：换抓取方式或代理可能成功，原样重试没有意义
+        return 'blocked'
+    if status_code in RETRYABLE_STATUS:
+        return 'retryable'
+    return 'terminal'
+
+def is_terminal_error(error):
+    """抓取错误是否重试也不会成功（404等终止状态码、解析失败），分布式队列据此直接确认而不再分发"""
+    if error.startswith("解析失败"):
+        return True
+    match = re.match(r'错误: HTTP状态码 (\d+)', error)
+    # 403可能是针对当前代理/工作者的封禁，换个工作者仍可能成功
+    return bool(match) and int(match.group(1)) != 403 and classify_status(int(match.group(1))) == 'terminal'
+
+def retry_backoff(attempt, retry_after=None):
+    """第attempt次重试前的等待秒数：指数退避加完全抖动，服务器给出Retry-After时不早于它"""
+    cap = min(CRAWL_SETTINGS['retry_backoff_max'], CRAWL_SETTINGS['retry_backoff_base'] * 2 ** attempt)
+    delay = random.uniform(0, cap)
+    if retry_after:
+        delay = max(delay, retry_after)
+    return delay
+
+class RetryBudget:
+    """全局重试预算
+    
+    每个请求存入retry_budget_ratio个令牌，每次重试消耗1个；另按每秒retry_budget_min个补充保底。
+    首次使用时预存retry_budget_min个令牌（至少1个），刚启动的进程也能立即重试。
+    大面积故障时重试总量被限制在请求量的固定比例内，不会把失败放大成重试风暴。
+    """
+    MAX_TOKENS = 100.0
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tokens = None
+        self._updated = time.time()
+    
+    def _seed(self):
+        # 在首次使用时读取设置，保证使用的是已加载的配置
+        if self._tokens is None:
+            self._tokens = min(self.MAX_TOKENS, max(1.0, float(CRAWL_SETTINGS['retry_budget_min'])))
+            self._updated = time.time()
+    
+    def record_request(self):
+        with self._lock:
+            self._seed()
+            self._tokens = min(self.MAX_TOKENS, self._tokens + CRAWL_SETTINGS['retry_budget_ratio'])
+    
+    def try_spend(self):
+        """尝试为一次重试扣除预算，预算不足时返回False"""
+        with self._lock:
+            self._seed()
+            now = time.time()
+            self._tokens = min(
+                self.MAX_TOKENS,
+                self._tokens + (now - self._updated) * CRAWL_SETTINGS['retry_budget_min']
+            )
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+RETRY_BUDGET = RetryBudget()
+
+def next_retry_delay(url, attempt, retry_after, deadline):
+    """决定是否进行第attempt次重试，返回等待秒数；超过时限或预算耗尽时返回None"""
+    delay = retry_backoff(attempt, retry_after)
+    if time.time() + delay > deadline:
+        logging.warning(f"超过重试时限，放弃: {url}")
+        return None
+    if not RETRY_BUDGET.try_spend():
+        logging.warning(f"全局重试预算耗尽，放弃重试: {url}")
+        return None
+    return delay
+
+def download_page(url, feedback):
+    """按该域名学习到的顺序尝试各抓取方式，返回 (HTML, 错误信息)
+    
+    每轮依次尝试各方式；只有可重试的失败（网络错误、5xx/429、反爬拦截）才进入下一轮，
+    轮次受retry_times、retry_deadline和全局重试预算限制，单个失败URL的耗时有上限。
+    feedback: 字典，记录最后一次响应的status/elapsed/retry_after，供调度器自适应限速
+    """
+    host = urlparse.urlparse(url).netloc
+    headers = {
+        'User-Agent': get_random_ua(host),
+        'Referer': get_random_referer(),
+        'DNT': '1',
+    }
+    verify = not CRAWL_SETTINGS['ignore_ssl']
+    use_cloudscraper = CRAWL_SETTINGS['use_cloudscraper']
+    deadline = time.time() + CRAWL_SETTINGS['retry_deadline']
+    retry_after = None
+    error = None
+    
+    for attempt in range(CRAWL_SETTINGS['retry_times'] + 1):
+        if attempt:
+            delay = next_retry_delay(url, attempt, retry_after, deadline)
+            if delay is None:
+                break
+            time.sleep(delay)
+        RETRY_BUDGET.record_request()
+        
+        proxy = get_current_proxy(host) if CRAWL_SETTINGS['use_proxy'] else None
+        proxies = proxy_dict(proxy)
+        # 从会话池获取长连接会话，避免每次请求都重新握手
+        session = requests_retry_session(proxy)
+        retry_after = None
+        retryable = False
+        
+        # 按该域名上次成功的方式排序，避免每次都先付出已知失败方式的超时代价
+        for method in STRATEGY_CACHE.order(host, enabled_fetch_methods(use_cloudscraper)):
+            start_time = time.time()
+            
+            try:
+                if method != 'requests':
+                    code, content = fetch_page_with(method, url, headers, proxy, verify)
+                    if code is not None:
+                        feedback.update(status=code, elapsed=time.time() - start_time)
+                        report_proxy_response(proxy, code, content, time.time() - start_time)
+                    if content and code < 400:
+                        STRATEGY_CACHE.record_success(host, method, time.time() - start_time)
+                        return content, None
+                    STRATEGY_CACHE.record_failure(host, method)
+                    if code and code >= 400 and classify_status(code, content) == 'terminal':
+                        # 404/410等终态：换抓取方式或重试都不会成功
+                        error = f"错误: HTTP状态码 {code}"
+                        retryable = False
+                        break
+                    continue
+                
+                # 普通请求
+                response = session.get(
+                    url, 
+                    headers=headers, 
+                    timeout=CRAWL_SETTINGS['timeout'], 
+                    proxies=proxies,
+                    verify=verify
+                )
+            except requests.exceptions.RequestException as e:
+                # 网络错误可重试，代理计入失败，下一轮换用其他代理
+                STRATEGY_CACHE.record_failure(host, method)
+                rotate_proxy(proxy, host)
+                error = f"抓取失败: {str(e)}"
+                retryable = True
+                continue
+            except Exception as e:
+                STRATEGY_CACHE.record_failure(host, method)
+                error = f"抓取失败: {str(e)}"
+                continue
+            
+            feedback.update(
+                status=response.status_code,
+                elapsed=time.time() - start_time,
+                retry_after=parse_retry_after(response.headers.get('Retry-After'))
+            )
+            report_proxy_response(proxy, response.status_code, response.text, time.time() - start_time)
+            
+            status = classify_status(response.status_code, response.text)
+            if status == 'ok':
+                STRATEGY_CACHE.record_success(host, method, time.time() - start_time)
+                return decode_response(response), None
+            
+            STRATEGY_CACHE.record_failure(host, method)
+            error = f"错误: HTTP状态码 {response.status_code}"
+            if status == 'blocked':
+                # 遇到Cloudflare防护：先改用cloudscraper，已启用时换代理（被封的代理已隔离）
+                if not use_cloudscraper:
+                    use_cloudscraper = True
+                    retryable = True
+                elif CRAWL_SETTINGS['use_proxy'] and CRAWL_SETTINGS['proxy_list']:
+                    retryable = True
+            elif status == 'retryable':
+                retry_after = feedback['retry_after']
+                retryable = True
+            else:
+                # 终态不再尝试其余抓取方式
+                retryable = False
+                break
+        
+        if not retryable:
+            break
+    
+    logging.error(f"抓取失败 {url}: {error or '所有抓取方式均失败'}")
+    return None, error or "所有抓取方式均失败"
+
+async def async_fetch_web_content(session, url, links_out=None, reserved=False):
+    """fetch_web_content的asyncio版本，回退顺序和返回值 (文本, 图片列表, 错误信息) 与同步版一致
+    
+    session: curl_cffi的AsyncSession，由调用方创建并在所有请求间共享
+    cloudscraper、Selenium和页面解析本身是阻塞的，放到线程中执行，不阻塞事件循环
+    """
+    # 检查URL是否已爬取（分布式模式）
+    if CRAWL_SETTINGS['use_distributed'] and await asyncio.to_thread(url_seen, url):
+        logging.info(f"URL已爬取: {url}")
+        if reserved:
+            HOST_SCHEDULER.release(url)
+        return None, [], "URL已爬取"
+    
+    if not reserved:
+        await HOST_SCHEDULER.acquire_async(url)
+    feedback = {}
+    try:
+        content, error = await async_download_page(session, url, feedback)
+    finally:
+        HOST_SCHEDULER.release(url, **feedback)
+    
+    if not content:
+        return None, [], error
+    return await async_process_page_content(url, content, links_out)
+
+async def async_download_page(session, url, feedback):
+    """download_page的asyncio版本，返回 (HTML, 错误信息)，重试策略相同"""
+    host = urlparse.urlparse(url).netloc
+    headers = {
+        'User-Agent': get_random_ua(host),
+        'Referer': get_random_referer(),
+        'DNT': '1',
+    }
+    verify = not CRAWL_SETTINGS['ignore_ssl']
+    use_cloudscraper = CRAWL_SETTINGS['use_cloudscraper']
+    deadline = time.time() + CRAWL_SETTINGS['retry_deadline']
+    retry_after = None
+    error = None
+    
+    for attempt in range(CRAWL_SETTINGS['retry_times'] + 1):
+        if attempt:
+            delay = next_retry_delay(url, attempt, retry_after, deadline)
+            if delay is None:
+                break
+            await asyncio.sleep(delay)
+        RETRY_BUDGET.record_request()
+        
+        proxy = get_current_proxy(host) if CRAWL_SETTINGS['use_proxy'] else None
+        proxies = proxy_dict(proxy)
+        retry_after = None
+        retryable = False
+        
+        for method in STRATEGY_CACHE.order(host, enabled_fetch_methods(use_cloudscraper)):
+            start_time = time.time()
+            
+            if method in ('cloudscraper', 'dynamic'):
+                # 阻塞的方式放到线程中执行
+                code, content = await asyncio.to_thread(fetch_page_with, method, url, headers, proxy, verify)
+                if code is not None:
+                    feedback.update(status=code, elapsed=time.time() - start_time)
+                    report_proxy_response(proxy, code, content, time.time() - start_time)
+                if content and code < 400:
+                    STRATEGY_CACHE.record_success(host, method, time.time() - start_time)
+                    return content, None
+                STRATEGY_CACHE.record_failure(host, method)
+                if code and code >= 400 and classify_status(code, content) == 'terminal':
+                    # 404/410等终态：换抓取方式或重试都不会成功
+                    error = f"错误: HTTP状态码 {code}"
+                    retryable = False
+                    break
+                continue
+            
+            try:
+                if method == 'curl_cffi':
+                    # 使用curl_cffi绕过TLS指纹检测
+                    response = await session.get(
+                        url,
+                        impersonate="chrome110",
+                        headers=headers,
+                        proxies=proxies,
+                        verify=verify,
+                        timeout=CRAWL_SETTINGS['timeout']
+                    )
+                else:
+                    # 普通请求
+                    response = await session.get(
+                        url,
+                        headers=headers,
+                        proxies=proxies,
+                        verify=verify,
+                        timeout=CRAWL_SETTINGS['timeout']
+                    )
+            except Exception as e:
+                # 网络错误可重试，代理计入失败，下一轮换用其他代理
+                logging.warning(f"{method}请求失败: {str(e)}")
+                STRATEGY_CACHE.record_failure(host, method)
+                rotate_proxy(proxy, host)
+                error = f"抓取失败: {str(e)}"
+                retryable = True
+                continue
+            
+            text = decode_response(response)
+            feedback.update(
+                status=response.status_code,
+                elapsed=time.time() - start_time,
+                retry_after=parse_retry_after(response.headers.get('Retry-After'))
+            )
+            report_proxy_response(proxy, response.status_code, text, time.time() - start_time)
+            
+            status = classify_status(response.status_code, text)
+            if status == 'ok':
+                STRATEGY_CACHE.record_success(host, method, time.time() - start_time)
+                return text, None
+            
+            STRATEGY_CACHE.record_failure(host, method)
+            error = f"错误: HTTP状态码 {response.status_code}"
+            if status == 'blocked':
+                # 遇到Cloudflare防护：先改用cloudscraper，已启用时换代理（被封的代理已隔离）
+                if not use_cloudscraper:
+                    use_cloudscraper = True
+                    retryable = True
+                elif CRAWL_SETTINGS['use_proxy'] and CRAWL_SETTINGS['proxy_list']:
+                    retryable = True
+            elif status == 'retryable':
+                retry_after = feedback['retry_after']
+                retryable = True
+            else:
+                # 终态不再尝试其余抓取方式
+                retryable = False
+                break
+        
+        if not retryable:
+            break
+    
+    logging.error(f"抓取失败 {url}: {error or '所有抓取方式均失败'}")
+    return None, error or "所有抓取方式均失败"
+
+async def async_fetch_many(urls, concurrency=None):
+    """并发抓取多个URL，结果顺序与urls一致"""
+    if concurrency is None:
+        concurrency = CRAWL_SETTINGS['async_concurrency']
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async with AsyncSession(max_clients=concurrency) as session:
+        async def fetch_one(url):
+            async with semaphore:
+                return await async_fetch_web_content(session, url)
+        
+        return await asyncio.gather(*(fetch_one(url) for url in urls))
 
-def fetch_web_content(url):
-    time.sleep(random.uniform(CRAWL_SETTINGS['request_delay'], CRAWL_SETTINGS['request_delay'] * 2))
+def fetch_many(urls, concurrency=None):
+    """async_fetch_many的同步包装，可在GUI的工作线程中直接调用"""
+    return asyncio.run(async_fetch_many(urls, concurrency))
+
+def crawl_site(start_url, max_depth=None, max_threads=None, max_pages=None,
+               executor=None, progress_callback=None, stop_event=None):
+    """多线程广度优先爬取整站
     
-    # 检查URL是否已爬取（分布式模式）
-    if CRAWL_SETTINGS['use_distributed'] and url_seen(url):
-        logging.info(f"URL已爬取: {url}")
-        return None, [], "URL已爬取"
+    以深度为优先级的前沿队列(frontier)逐层展开链接，同时让max_threads个
+    工作线程并发执行fetch_web_content。
     
-    session = requests_retry_session()
-    headers = {
-        'User-Agent': get_random_ua(),
-        'Referer': get_random_referer(),
-        'DNT': '1',
-    }
+    progress_callback(page, stats): 每完成一个页面回调一次（在调用线程中执行）
+    stop_event: threading.Event，置位后停止调度新页面
+    返回 (页面结果列表, 统计信息)
+    """
+    if max_depth is None:
+        max_depth = CRAWL_SETTINGS['max_depth']
+    if max_threads is None:
+        max_threads = CRAWL_SETTINGS['max_threads']
     
-    proxies = None
-    if CRAWL_SETTINGS['use_proxy']:
-        proxy = get_current_proxy()
-        if proxy:
-            proxies = {
-                'http': proxy,
-                'https': proxy,
-            }
+    # asyncio后端：单线程事件循环代替线程池
+    if CRAWL_SETTINGS['async_fetch']:
+        return asyncio.run(async_crawl_site(
+            start_url, max_depth, CRAWL_SETTINGS['async_concurrency'],
+            max_pages, progress_callback, stop_event
+        ))
     
-    verify = not CRAWL_SETTINGS['ignore_ssl']
-    content = None
-    image_resources = []
+    # 前沿队列: (深度, 序号, URL)，深度小的先出队
+    frontier = [(0, 0, start_url)]
+    seen = {start_url}
+    seq = 1
+    results = []
+    stats = {'pages': 0, 'errors': 0, 'queued': 1, 'elapsed': 0.0, 'pages_per_sec': 0.0}
+    
+    own_executor = executor is None
+    if own_executor:
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_threads)
+    
+    def fetch_task(url, depth):
+        links = []
+        # 起始页面是否抓取由调用方决定，只检查发现的链接
+        # pop_ready_url已占用该主机的请求名额，不抓取时要归还
+        if depth > 0 and CRAWL_SETTINGS['obey_robots'] and not ROBOTS_CACHE.can_fetch(url):
+            HOST_SCHEDULER.release(url)
+            return {'url': url, 'depth': depth, 'text': None, 'images': [], 'links': [], 'error': "robots.txt禁止抓取"}
+        text, images, error = fetch_web_content(url, links if depth < max_depth else None, reserved=True)
+        return {
+            'url': url,
+            'depth': depth,
+            'text': text,
+            'images': images,
+            'links': links,
+            'error': error,
+        }
     
+    start_time = time.time()
+    running = {}
     try:
-        # 使用curl_cffi绕过TLS指纹检测
-        if CRAWL_SETTINGS['tls_fingerprint']:
-            try:
-                response = curl_requests.get(
-                    url,
-                    impersonate="chrome110",  # 模拟Chrome指纹
-                    headers=headers,
-                    proxies=proxies,
-                    verify=verify,
-                    timeout=CRAWL_SETTINGS['timeout']
-                )
-                content = response.text
-            except Exception as e:
-                logging.warning(f"curl_cffi请求失败: {str(e)}")
-        
-        # 尝试使用cloudscraper绕过Cloudflare
-        if not content and CRAWL_SETTINGS['use_cloudscraper']:
-            try:
-                scraper = cloudscraper.create_scraper()
-                response = scraper.get(url, timeout=CRAWL_SETTINGS['timeout'], proxies=proxies)
-                content = response.text
-            except Exception as e:
-                logging.warning(f"cloudscraper失败: {str(e)}")
-        
-        # 如果以上方法都未获取内容，使用动态渲染或普通请求
-        if not content and CRAWL_SETTINGS['dynamic_rendering']:
-            content = render_dynamic_page(url)
-        
-        # 如果以上方法都未获取内容，使用普通请求
-        if not content:
-            response = session.get(
-                url, 
-                headers=headers, 
-                timeout=CRAWL_SETTINGS['timeout'], 
-                proxies=proxies,
-                verify=verify
-            )
+        while frontier or running:
+            # 填满工作线程
+            wait = None
+            while frontier and len(running) < max_threads:
+                if stop_event is not None and stop_event.is_set():
+                    frontier.clear()
+                    break
+                if max_pages and stats['pages'] + len(running) >= max_pages:
+                    frontier.clear()
+                    break
+                # 只调度主机已就绪的URL，其他主机的请求间隔不占用工作线程
+                item, wait = pop_ready_url(frontier)
+                if item is None:
+                    break
+                depth, _, url = item
+                running[executor.submit(fetch_task, url, depth)] = url
             
-            if response.status_code == 403 and 'cloudflare' in response.text.lower():
-                # 遇到Cloudflare防护，尝试切换方法
-                if not CRAWL_SETTINGS['use_cloudscraper']:
-                    # 启用cloudscraper重试
-                    CRAWL_SETTINGS['use_cloudscraper'] = True
-                    return fetch_web_content(url)
-                elif CRAWL_SETTINGS['use_proxy']:
-                    # 切换代理
-                    rotate_proxy()
-                    return fetch_web_content(url)
+            if not running:
+                if frontier:
+                    time.sleep(wait)
+                    continue
+                break
             
-            # 处理编码问题
-            if not response.encoding or response.encoding.lower() == 'iso-8859-1':
-                encoding_detected = chardet.detect(response.content)['encoding']
-                if encoding_detected:
-                    response.encoding = encoding_detected
+            done, _ = concurrent.futures.wait(
+                running,
+                timeout=wait,
+                return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                url = running.pop(future)
+                try:
+                    page = future.result()
+                except Exception as e:
+                    page = {'url': url, 'depth': 0, 'text': None, 'images': [], 'links': [], 'error': str(e)}
+                
+                stats['pages'] += 1
+                if page['error']:
+                    stats['errors'] += 1
+                
+                # 新发现的链接进入下一层
+                for link in page['links']:
+                    # 去掉锚点，同一页面的不同锚点只抓取一次
+                    link = urlparse.urldefrag(link)[0]
+                    if link not in seen:
+                        seen.add(link)
+                        # 新主机进入前沿队列时预取robots.txt
+                        if CRAWL_SETTINGS['obey_robots']:
+                            ROBOTS_CACHE.prefetch(link)
+                        heapq.heappush(frontier, (page['depth'] + 1, seq, link))
+                        seq += 1
+                        stats['queued'] += 1
+                
+                results.append(page)
+                stats['elapsed'] = time.time() - start_time
+                stats['pages_per_sec'] = stats['pages'] / stats['elapsed'] if stats['elapsed'] > 0 else 0.0
+                
+                if progress_callback:
+                    try:
+                        progress_callback(page, stats)
+                    except Exception as e:
+                        logging.warning(f"进度回调失败: {str(e)}")
+    finally:
+        if own_executor:
+            executor.shutdown(wait=False)
+    
+    stats['elapsed'] = time.time() - start_time
+    stats['pages_per_sec'] = stats['pages'] / stats['elapsed'] if stats['elapsed'] > 0 else 0.0
+    logging.info(f"整站爬取完成: {stats['pages']} 页, 失败 {stats['errors']} 页, {stats['pages_per_sec']:.2f} 页/秒")
+    return results, stats
+
+async def async_crawl_site(start_url, max_depth, concurrency, max_pages=None,
+                           progress_callback=None, stop_event=None):
+    """crawl_site的asyncio实现，所有请求共享一个AsyncSession，单线程即可维持大量并发连接"""
+    frontier = [(0, 0, start_url)]
+    seen = {start_url}
+    seq = 1
+    results = []
+    stats = {'pages': 0, 'errors': 0, 'queued': 1, 'elapsed': 0.0, 'pages_per_sec': 0.0}
+    
+    async def fetch_task(session, url, depth):
+        links = []
+        if depth > 0 and CRAWL_SETTINGS['obey_robots'] and not await asyncio.to_thread(ROBOTS_CACHE.can_fetch, url):
+            HOST_SCHEDULER.release(url)
+            return {'url': url, 'depth': depth, 'text': None, 'images': [], 'links': [], 'error': "robots.txt禁止抓取"}
+        text, images, error = await async_fetch_web_content(
+            session, url, links if depth < max_depth else None, reserved=True
+        )
+        return {
+            'url': url,
+            'depth': depth,
+            'text': text,
+            'images': images,
+            'links': links,
+            'error': error,
+        }
+    
+    start_time = time.time()
+    running = {}
+    async with AsyncSession(max_clients=concurrency) as session:
+        while frontier or running:
+            wait = None
+            while frontier and len(running) < concurrency:
+                if stop_event is not None and stop_event.is_set():
+                    frontier.clear()
+                    break
+                if max_pages and stats['pages'] + len(running) >= max_pages:
+                    frontier.clear()
+                    break
+                item, wait = pop_ready_url(frontier)
+                if item is None:
+                    break
+                depth, _, url = item
+                running[asyncio.ensure_future(fetch_task(session, url, depth))] = url
             
-            try:
-                content = response.text
-            except UnicodeDecodeError:
-                content = response.content.decode('utf-8', errors='replace')
+            if not running:
+                if frontier:
+                    await asyncio.sleep(wait)
+                    continue
+                break
             
-            if response.status_code != 200:
-                return None, [], f"错误: HTTP状态码 {response.status_code}"
-        
+            done, _ = await asyncio.wait(
+                running,
+                timeout=wait,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                url = running.pop(task)
+                try:
+                    page = task.result()
+                except Exception as e:
+                    page = {'url': url, 'depth': 0, 'text': None, 'images': [], 'links': [], 'error': str(e)}
+                
+                stats['pages'] += 1
+                if page['error']:
+                    stats['errors'] += 1
+                
+                for link in page['links']:
+                    # 去掉锚点，同一页面的不同锚点只抓取一次
+                    link = urlparse.urldefrag(link)[0]
+                    if link not in seen:
+                        seen.add(link)
+                        # 新主机进入前沿队列时预取robots.txt
+                        if CRAWL_SETTINGS['obey_robots']:
+                            ROBOTS_CACHE.prefetch(link)
+                        heapq.heappush(frontier, (page['depth'] + 1, seq, link))
+                        seq += 1
+                        stats['queued'] += 1
+                
+                results.append(page)
+                stats['elapsed'] = time.time() - start_time
+                stats['pages_per_sec'] = stats['pages'] / stats['elapsed'] if stats['elapsed'] > 0 else 0.0
+                
+                if progress_callback:
+                    try:
+                        progress_callback(page, stats)
+                    except Exception as e:
+                        logging.warning(f"进度回调失败: {str(e)}")
+    
+    stats['elapsed'] = time.time() - start_time
+    stats['pages_per_sec'] = stats['pages'] / stats['elapsed'] if stats['elapsed'] > 0 else 0.0
+    logging.info(f"整站爬取完成(asyncio): {stats['pages']} 页, 失败 {stats['errors']} 页, {stats['pages_per_sec']:.2f} 页/秒")
+    return results, stats
+
+# 常见正文容器的CSS选择器及对应XPath
+CONTENT_SELECTORS = [
+    ('article', '//article'),
+    ('main', '//main'),
+    ('.article', "//*[contains(concat(' ', normalize-space(@class), ' '), ' article ')]"),
+    ('.content', "//*[contains(concat(' ', normalize-space(@class), ' '), ' content ')]"),
+    ('.post-content', "//*[contains(concat(' ', normalize-space(@class), ' '), ' post-content ')]"),
+    ('.entry-content', "//*[contains(concat(' ', normalize-space(@class), ' '), ' entry-content ')]"),
+    ('.story-content', "//*[contains(concat(' ', normalize-space(@class), ' '), ' story-content ')]"),
+    ('.article-body', "//*[contains(concat(' ', normalize-space(@class), ' '), ' article-body ')]"),
+    ('#article', "//*[@id='article']"),
+    ('#content', "//*[@id='content']"),
+    ('#main-content', "//*[@id='main-content']"),
+    ('#post-content', "//*[@id='post-content']"),
+]
+# 各选择器单独编译的XPath（用于域名缓存命中时直接定位）
+CONTENT_SELECTOR_XPATHS = [etree.XPath(xpath) for _, xpath in CONTENT_SELECTORS]
+# 标签名/id/class名 -> 选择器序号，用于一次遍历中查表匹配
+CONTENT_SELECTOR_TAGS = {s: i for i, (s, _) in enumerate(CONTENT_SELECTORS) if s[0] not in '.#'}
+CONTENT_SELECTOR_IDS = {s[1:]: i for i, (s, _) in enumerate(CONTENT_SELECTORS) if s[0] == '#'}
+CONTENT_SELECTOR_CLASSES = {s[1:]: i for i, (s, _) in enumerate(CONTENT_SELECTORS) if s[0] == '.'}
+
+def find_content_candidates(doc):
+    """一次遍历找出所有候选正文容器，返回按选择器优先级排序的 [(选择器序号, 元素)]
+    
+    所有选择器在同一次遍历中按标签/id/class查表匹配（合并成一个XPath时libxml2仍会对每个分支各扫描一次）。
+    每个选择器只保留文档中第一个匹配的元素，与按CONTENT_SELECTORS顺序逐个select_one的结果一致
+    """
+    first_match = {}
+    for element in doc.tree.iter(etree.Element):
+        index = CONTENT_SELECTOR_TAGS.get(element.tag)
+        if index is not None and index not in first_match:
+            first_match[index] = element
+        
+        attributes = element.attrib
+        if 'id' in attributes:
+            index = CONTENT_SELECTOR_IDS.get(attributes['id'])
+            if index is not None and index not in first_match:
+                first_match[index] = element
+        if 'class' in attributes:
+            for name in attributes['class'].split():
+                index = CONTENT_SELECTOR_CLASSES.get(name)
+                if index is not None and index not in first_match:
+                    first_match[index] = element
+    return sorted(first_match.items())
+
+class ContentSelectorCache:
+    """按域名记录上次提取到正文的选择器
+    
+    同一站点的页面通常使用相同模板，之后的页面直接用该选择器定位正文；
+    缓存的选择器连续失败content_selector_failures次后丢弃，重新全量匹配。
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hosts = {}
+    
+    def get(self, host):
+        with self._lock:
+            entry = self._hosts.get(host)
+            return entry['selector'] if entry else None
+    
+    def record_success(self, host, selector):
+        with self._lock:
+            entry = self._hosts.get(host)
+            if entry is None or entry['selector'] != selector:
+                if len(self._hosts) >= 10000:
+                    self._hosts.clear()
+                entry = self._hosts[host] = {'selector': selector, 'hits': 0, 'failures': 0}
+            entry['hits'] += 1
+            entry['failures'] = 0
+    
+    def record_failure(self, host):
+        with self._lock:
+            entry = self._hosts.get(host)
+            if entry is None:
+                return
+            entry['failures'] += 1
+            if entry['failures'] >= CRAWL_SETTINGS['content_selector_failures']:
+                del self._hosts[host]
+    
+    def snapshot(self):
+        """返回当前所有记录的副本（用于日志和调试）"""
+        with self._lock:
+            return {host: dict(entry, selector=CONTENT_SELECTORS[entry['selector']][0])
+                    for host, entry in self._hosts.items()}
+
+CONTENT_SELECTOR_CACHE = ContentSelectorCache()
+
+# 启发式正文提取：不计入文本的节点、作为段落计分的块级节点、候选段落的最低文本长度和最高链接密度
+CONTENT_EXCLUDED_TAGS = frozenset(('script', 'style', 'noscript'))
+CONTENT_BLOCK_TAGS = frozenset(('p', 'div'))
+CONTENT_MIN_LENGTH = 50
+CONTENT_MAX_LINK_DENSITY = 0.3
+# 与最佳块同级、得分不低于该比例的块一并输出
+CONTENT_SIBLING_RATIO = 0.2
+
+def score_content_blocks(root):
+    """一次自底向上遍历为节点计算文本长度、链接文本长度和得分，返回正文块列表（按文档顺序）
+    
+    节点的文本长度 = 自身文本 + 子节点尾随文本 + 子节点文本长度，链接文本长度同理由子节点累加，
+    因此整棵树只遍历一次，耗时与DOM大小成线性关系。
+    不含p/div子孙的p/div视为段落，满足长度和链接密度要求时以 文本长度*(1-链接密度) 计分，
+    分数加到自身、父节点和（减半）祖父节点上；最终取 得分*(1-链接密度) 最高的节点及得分相近的同级节点。
+    """
+    text_length = {}
+    link_length = {}
+    has_block = {}
+    scores = {}
+    densities = {}
+    
+    for _, element in etree.iterwalk(root, events=('end',)):
+        tag = element.tag
+        total = links = 0
+        contains_block = False
+        if isinstance(tag, str) and tag not in CONTENT_EXCLUDED_TAGS:
+            if element.text:
+                total = len(element.text.strip())
+            for child in element:
+                # iterwalk不为注释和处理指令产生end事件，它们只有尾随文本计入当前节点
+                if isinstance(child.tag, str):
+                    total += text_length.pop(child)
+                    links += link_length.pop(child)
+                    if has_block.pop(child) or child.tag in CONTENT_BLOCK_TAGS:
+                        contains_block = True
+                # 注释、脚本等子节点的尾随文本仍属于当前节点
+                if child.tail:
+                    total += len(child.tail.strip())
+            if tag == 'a':
+                links = total
+        
+        text_length[element] = total
+        link_length[element] = links
+        has_block[element] = contains_block
+        
+        if tag in CONTENT_BLOCK_TAGS and not contains_block and total >= CONTENT_MIN_LENGTH:
+            weight = total - links
+            if links < total * CONTENT_MAX_LINK_DENSITY:
+                scores[element] = scores.get(element, 0) + weight
+                parent = element.getparent()
+                if parent is not None:
+                    scores[parent] = scores.get(parent, 0) + weight
+                    grandparent = parent.getparent()
+                    if grandparent is not None:
+                        scores[grandparent] = scores.get(grandparent, 0) + weight / 2
+        
+        # 子孙段落的得分总是在祖先结束前加上，此时祖先的链接密度也已确定
+        if element in scores:
+            densities[element] = links / total if total else 0
+    
+    if not scores:
+        return []
+    
+    ranked = {element: score * (1 - densities[element]) for element, score in scores.items()}
+    best = max(ranked, key=ranked.get)
+    parent = best.getparent()
+    if parent is None:
+        return [best]
+    threshold = ranked[best] * CONTENT_SIBLING_RATIO
+    return [sibling for sibling in parent
+            if sibling is best or ranked.get(sibling, 0) >= threshold]
+
+# 可作为模板路径一部分的id/class名（含数字的通常因页面而异）
+TEMPLATE_NAME_PATTERN = re.compile(r'^[A-Za-z_-]+$')
+# 按模板提取的文本短于学习时中位长度的该比例时视为模板失效
+TEMPLATE_MIN_LENGTH_RATIO = 0.25
+# 每次按模板提取后置信度的更新权重
+TEMPLATE_CONFIDENCE_WEIGHT = 0.1
+
+def template_step(element):
+    """元素在模板路径中的一步：优先用稳定的id或class，否则用同名兄弟中的位置"""
+    tag = element.tag
+    element_id = element.get('id')
+    if element_id and TEMPLATE_NAME_PATTERN.match(element_id):
+        return f"{tag}[@id='{element_id}']"
+    for name in (element.get('class') or '').split():
+        if TEMPLATE_NAME_PATTERN.match(name):
+            return f"{tag}[contains(concat(' ', normalize-space(@class), ' '), ' {name} ')]"
+    if element.getparent() is None:
+        return tag
+    return f"{tag}[{sum(1 for _ in element.itersiblings(tag, preceding=True)) + 1}]"
+
+def template_path(element, root=None):
+    """元素的结构化XPath；指定root时返回相对root的路径"""
+    steps = []
+    while element is not None and element is not root:
+        steps.append(template_step(element))
+        element = element.getparent()
+    path = '/'.join(reversed(steps))
+    return './' + path if root is not None else '/' + path
+
+def template_text(node, excluded):
+    """提取节点文本（同node_text(node, '\\n')），跳过excluded中的元素及其子孙"""
+    if not excluded:
+        return node_text(node, '\n')
+    parts = []
+    for text in node.xpath(TEXT_XPATH):
+        stripped = text.strip()
+        if not stripped:
+            continue
+        owner = text.getparent()
+        if text.is_tail:
+            owner = owner.getparent()
+        while owner is not None and owner is not node and owner not in excluded:
+            owner = owner.getparent()
+        if owner is None or owner is node:
+            parts.append(stripped)
+    return '\n'.join(parts)
+
+class TemplateLearner:
+    """按域名学习正文提取模板
+    
+    对走完整提取流程的页面，用score_content_blocks找出正文节点并记录其结构化XPath，
+    以及正文节点下两层内各块的路径和文本摘要。同一域名积累template_min_pages个页面后，
+    若大多数页面（不低于template_min_confidence）的正文路径相同，即以该路径为模板，
+    在这些页面中文本完全相同的块视为模板内的固定内容（分享栏、版权声明等）。
+    之后该域名的页面直接按模板XPath取正文并剔除固定块；取不到或文本明显过短时置信度下降，
+    降到template_min_confidence以下时丢弃模板、回退到完整提取并重新学习。
+    模板保存在template_file中，供之后的重复爬取使用；多个解析子进程共用该文件，
+    保存时先与磁盘上的内容合并（同一域名保留较新学到的模板），并采用其他进程学到的模板。
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._templates = {}
+        self._observations = {}
+        self._compiled = {}
+        # 本进程丢弃的模板：域名 -> 学习时间，合并时从磁盘上删除同一份模板
+        self._dropped = {}
+        # 本进程新学到、尚未保存的模板域名；其余不在磁盘上的模板已被其他进程丢弃
+        self._unsaved = set()
+        self._loaded = False
+    
+    def _load(self):
+        """从磁盘加载模板（只执行一次）"""
+        self._loaded = True
         try:
-            soup = BeautifulSoup(content, 'lxml')
-        except Exception:
-            try:
-                soup = BeautifulSoup(content, 'html.parser')
-            except Exception as e:
-                return None, [], f"解析失败: {str(e)}"
-        
-        if CRAWL_SETTINGS['image_crawling']:
-            image_resources = find_image_resources(soup, url)
-            logging.info(f"找到 {len(image_resources)} 张图片")
-        
-        text = ""
-        if CRAWL_SETTINGS['text_crawling']:
-            # 改进的内容提取方法
-            text = extract_main_content(soup, url)
-        
-        # 标记URL为已爬取（分布式模式）
-        if CRAWL_SETTINGS['use_distributed']:
-            mark_url_seen(url)
+            with open(CRAWL_SETTINGS['template_file'], 'r', encoding='utf-8') as f:
+                self._templates = json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f"加载正文模板失败: {str(e)}")
+    
+    def save(self):
+        """与磁盘上的模板合并后保存"""
+        if not self._loaded:
+            return
+        path = CRAWL_SETTINGS['template_file']
+        try:
+            with self._save_lock:
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        on_disk = json.load(f)
+                except FileNotFoundError:
+                    on_disk = {}
+                
+                with self._lock:
+                    for host, learned in self._dropped.items():
+                        if host in on_disk and on_disk[host].get('learned') == learned:
+                            del on_disk[host]
+                    for host, template in list(self._templates.items()):
+                        current = on_disk.get(host)
+                        if current is None and host not in self._unsaved:
+                            del self._templates[host]
+                        elif current is None or current.get('learned', 0) <= template['learned']:
+                            on_disk[host] = template
+                    # 采用其他进程学到的模板
+                    for host, template in on_disk.items():
+                        if host not in self._templates:
+                            self._templates[host] = template
+                            self._observations.pop(host, None)
+                    self._dropped.clear()
+                    self._unsaved.clear()
+                    templates = json.loads(json.dumps(on_disk))
+                
+                tmp_file = f'{path}.{os.getpid()}.tmp'
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    json.dump(templates, f, ensure_ascii=False)
+                os.replace(tmp_file, path)
+        except Exception as e:
+            logging.warning(f"保存正文模板失败: {str(e)}")
+    
+    def _xpath(self, expr):
+        compiled = self._compiled.get(expr)
+        if compiled is None:
+            compiled = self._compiled[expr] = etree.XPath(expr)
+        return compiled
+    
+    def get(self, host):
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            return self._templates.get(host)
+    
+    def extract(self, host, doc):
+        """按模板提取正文，没有模板或模板不适用时返回None"""
+        template = self.get(host)
+        if template is None:
+            return None
         
-        return text, image_resources, None
+        text = None
+        try:
+            elements = self._xpath(template['xpath'])(doc.tree)
+            if elements:
+                node = elements[0]
+                excluded = set()
+                for path in template['boilerplate']:
+                    excluded.update(self._xpath(path)(node))
+                text = template_text(node, excluded)
+        except Exception as e:
+            logging.warning(f"按模板提取正文失败: {str(e)}")
+        
+        ok = text is not None and len(text) >= template['length'] * TEMPLATE_MIN_LENGTH_RATIO
+        dropped = False
+        with self._lock:
+            template['confidence'] = template['confidence'] * (1 - TEMPLATE_CONFIDENCE_WEIGHT) + TEMPLATE_CONFIDENCE_WEIGHT * ok
+            template['uses'] += 1
+            if template['confidence'] < CRAWL_SETTINGS['template_min_confidence'] and self._templates.get(host) is template:
+                del self._templates[host]
+                self._dropped[host] = template['learned']
+                dropped = True
+        if dropped:
+            logging.info(f"域名 {host} 的正文模板置信度降至 {template['confidence']:.2f}，回退到完整提取并重新学习")
+            self.save()
+        return text if ok else None
     
-    except requests.exceptions.RequestException as e:
-        # 网络请求错误，尝试切换代理
-        if CRAWL_SETTINGS['use_proxy'] and CRAWL_SETTINGS['proxy_list']:
-            rotate_proxy()
-            return fetch_web_content(url)
+    def observe(self, host, doc):
+        """记录一个走完整提取流程的页面，积累足够页面后尝试学习模板"""
+        blocks = score_content_blocks(doc.tree)
+        if not blocks:
+            return
+        node = blocks[0] if len(blocks) == 1 else blocks[0].getparent()
+        
+        parts = set()
+        for child in node.iterchildren(etree.Element):
+            for element in (child, *child.iterchildren(etree.Element)):
+                text = node_text(element)
+                if text:
+                    parts.add((template_path(element, node), hashlib.md5(text.encode('utf-8')).hexdigest()))
+        observation = {'xpath': template_path(node), 'parts': parts, 'length': len(node_text(node, '\n'))}
+        
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            if host in self._templates:
+                return
+            observations = self._observations.setdefault(host, [])
+            observations.append(observation)
+            if len(observations) < CRAWL_SETTINGS['template_min_pages']:
+                return
+            template = self._learn(observations)
+            if template is None:
+                # 路径不稳定时按滑动窗口继续观察
+                observations.pop(0)
+                return
+            self._templates[host] = template
+            self._unsaved.add(host)
+            del self._observations[host]
         
-        logging.error(f"抓取失败: {str(e)}")
-        return None, [], f"抓取失败: {str(e)}"
+        logging.info(f"已学习域名 {host} 的正文模板: {template['xpath']} "
+                     f"(置信度 {template['confidence']:.2f}, 固定块 {len(template['boilerplate'])} 个)")
+        self.save()
+    
+    def _learn(self, observations):
+        counts = {}
+        for observation in observations:
+            counts[observation['xpath']] = counts.get(observation['xpath'], 0) + 1
+        xpath = max(counts, key=counts.get)
+        support = counts[xpath] / len(observations)
+        if support < CRAWL_SETTINGS['template_min_confidence']:
+            return None
+        
+        matching = [o for o in observations if o['xpath'] == xpath]
+        part_counts = {}
+        for observation in matching:
+            for part in observation['parts']:
+                part_counts[part] = part_counts.get(part, 0) + 1
+        # 在大多数页面中路径和文本都相同的块是模板自带的固定内容
+        required = max(2, len(matching) * CRAWL_SETTINGS['template_min_confidence'])
+        boilerplate = sorted({path for (path, _), count in part_counts.items() if count >= required})
+        lengths = sorted(o['length'] for o in matching)
+        return {
+            'xpath': xpath,
+            'boilerplate': boilerplate,
+            'length': lengths[len(lengths) // 2],
+            'confidence': support,
+            'pages': len(matching),
+            'uses': 0,
+            'learned': time.time(),
+        }
+    
+    def snapshot(self):
+        """返回当前所有模板的副本（用于日志和调试）"""
+        with self._lock:
+            return json.loads(json.dumps(self._templates))
+
+TEMPLATE_LEARNER = TemplateLearner()
+atexit.register(TEMPLATE_LEARNER.save)
+
+def extract_main_content(doc, url):
+    """智能内容提取方法，doc为ParsedDocument（传入BeautifulSoup时会转换）
+    
+    启用template_learning时，已学到模板的域名直接按模板提取；
+    其余页面走完整提取流程，并用于学习该域名的模板
+    """
+    if not isinstance(doc, ParsedDocument):
+        doc = ParsedDocument(str(doc), url)
+    if not CRAWL_SETTINGS['template_learning']:
+        return extract_content_full(doc, url)
+    
+    host = urlparse.urlparse(url).netloc
+    text = TEMPLATE_LEARNER.extract(host, doc)
+    if text is not None:
+        return clean_text(text)
+    
+    text = extract_content_full(doc, url)
+    try:
+        TEMPLATE_LEARNER.observe(host, doc)
     except Exception as e:
-        logging.error(f"抓取失败: {str(e)}")
-        return None, [], f"抓取失败: {str(e)}"
+        logging.warning(f"学习正文模板失败: {str(e)}")
+    return text
 
-def extract_main_content(soup, url):
-    """智能内容提取方法"""
+def extract_content_full(doc, url):
+    """完整的正文提取流程：Readability、正文选择器、启发式计分，依次尝试"""
     # 使用AI增强的内容提取
     if CRAWL_SETTINGS['ai_content_extraction']:
         try:
-            # 使用Readability算法改进版
-            doc = Document(str(soup))
-            content_html = doc.summary()
+            # 使用Readability算法改进版，直接传入已解析的树（Readability内部会复制，不影响原树）
+            readability_doc = Document(doc.tree)
+            content_html = readability_doc.summary()
             content_tree = fromstring(content_html)
             text = content_tree.text_content()
             
@@ -621,53 +3460,34 @@ def extract_main_content(soup, url):
         except Exception as e:
             logging.warning(f"AI内容提取失败: {str(e)}, 使用备用方法")
     
-    # 尝试识别常见的内容区域
-    content_selectors = [
-        'article',
-        'main',
-        '.article',
-        '.content',
-        '.post-content',
-        '.entry-content',
-        '.story-content',
-        '.article-body',
-        '#article',
-        '#content',
-        '#main-content',
-        '#post-content'
-    ]
-    
-    for selector in content_selectors:
-        element = soup.select_one(selector)
-        if element:
-            text = element.get_text(separator='\n', strip=True)
-            if len(text) > 500:  # 确保有足够内容
+    # 该域名上次命中的选择器直接定位正文
+    host = urlparse.urlparse(url).netloc
+    cached = CONTENT_SELECTOR_CACHE.get(host)
+    if cached is not None:
+        elements = CONTENT_SELECTOR_XPATHS[cached](doc.tree)
+        if elements:
+            text = node_text(elements[0], '\n')
+            if len(text) > 500:
+                CONTENT_SELECTOR_CACHE.record_success(host, cached)
                 return clean_text(text)
+        CONTENT_SELECTOR_CACHE.record_failure(host)
     
-    # 如果未找到，使用启发式方法
-    paragraphs = soup.find_all(['p', 'div'])
-    text_candidates = []
-    total_text = ""
-    
-    for p in paragraphs:
-        if len(p.get_text(strip=True)) < 50:
+    # 尝试识别常见的内容区域（一次遍历找出所有候选，按选择器优先级检查）
+    for index, element in find_content_candidates(doc):
+        if index == cached:
             continue
-        
-        # 计算链接密度
-        links = p.find_all('a')
-        link_text_length = sum(len(a.get_text(strip=True)) for a in links)
-        total_text_length = len(p.get_text(strip=True))
-        link_density = link_text_length / total_text_length if total_text_length > 0 else 0
-        
-        if link_density < 0.3:
-            text_candidates.append(p.get_text(strip=True))
-            total_text += p.get_text(strip=True) + "\n\n"
+        text = node_text(element, '\n')
+        if len(text) > 500:  # 确保有足够内容
+            CONTENT_SELECTOR_CACHE.record_success(host, index)
+            return clean_text(text)
     
-    if text_candidates:
-        return clean_text('\n\n'.join(text_candidates))
+    # 如果未找到，使用启发式方法（一次遍历为所有节点计分）
+    blocks = score_content_blocks(doc.tree)
+    if blocks:
+        return clean_text('\n\n'.join(node_text(block, '\n') for block in blocks))
     
     # 最后手段：获取整个文本
-    return clean_text(soup.get_text(separator='\n', strip=True))
+    return clean_text(node_text(doc.tree, '\n'))
 
 def clean_text(text):
     """清理和格式化文本"""
@@ -689,34 +3509,318 @@ def clean_text(text):
     
     return cleaned_text
 
-def detect_anomaly(text):
-    """使用孤立森林检测异常内容"""
-    if len(text) < 100:
-        return False
+# 异常检测使用的文本特征
+ANOMALY_FEATURES = ('num_lines', 'avg_line_length', 'special_ratio', 'repetition_ratio')
+# 短于该长度的文本不做异常判断
+ANOMALY_MIN_LENGTH = 100
+
+# 重复内容检测的分块长度
+ANOMALY_CHUNK_SIZE = 50
+# 分块哈希使用的乘数：每个64位字一个固定的随机奇数（整数运算，相同的块总是得到相同的哈希）
+_CHUNK_HASH_KEYS = np.random.RandomState(0x5EED).randint(
+    1, 2**62, size=ANOMALY_CHUNK_SIZE * 4 // 8, dtype=np.int64
+).astype(np.uint64) * np.uint64(2) + np.uint64(1)
+# 分块哈希时每批处理的行数：中间数组（约200KB）留在CPU缓存中，大文本不必反复读写整块内存
+_CHUNK_HASH_ROWS = 1024
+# "特殊字符"（非字母数字、非空白）查找表，按Unicode平面（每平面65536个码点）在首次用到时生成
+_SPECIAL_TABLE = np.zeros(0, dtype=bool)
+
+def special_char_table(max_code=0xFFFF):
+    """返回至少覆盖到max_code所在平面的特殊字符查找表"""
+    global _SPECIAL_TABLE
+    size = ((max_code >> 16) + 1) << 16
+    if len(_SPECIAL_TABLE) < size:
+        start = len(_SPECIAL_TABLE)
+        extension = np.fromiter(
+            (not (c.isalnum() or c.isspace()) for c in map(chr, range(start, size))),
+            dtype=bool, count=size - start
+        )
+        _SPECIAL_TABLE = np.concatenate((_SPECIAL_TABLE, extension))
+    return _SPECIAL_TABLE
+
+def count_unique_blocks(blocks):
+    """统计二维码点数组中不同行的数量
     
-    try:
+    每行按64位字乘以固定奇数、移位异或后求和（按2^64取模）得到哈希值，只对哈希排序；
+    同一哈希组内的行再与组首行逐一比对，出现哈希冲突时退回按整行去重，结果始终精确。
+    blocks需为C连续的uint32数组，每行字节数是8的倍数。
+    """
+    words = blocks.view(np.uint64)
+    hashes = np.empty(len(words), dtype=np.uint64)
+    for start in range(0, len(words), _CHUNK_HASH_ROWS):
+        mixed = words[start:start + _CHUNK_HASH_ROWS] * _CHUNK_HASH_KEYS
+        mixed ^= mixed >> np.uint64(29)
+        mixed.sum(axis=1, dtype=np.uint64, out=hashes[start:start + _CHUNK_HASH_ROWS])
+    order = np.argsort(hashes)
+    sorted_hashes = hashes[order]
+    new_group = np.concatenate(([True], sorted_hashes[1:] != sorted_hashes[:-1]))
+    
+    # 同一哈希组内每行都要与组首行相同，否则存在哈希冲突
+    duplicate = np.flatnonzero(~new_group)
+    group_start = np.maximum.accumulate(np.where(new_group, np.arange(len(order)), 0))
+    if not np.array_equal(blocks[order[duplicate]], blocks[order[group_start[duplicate]]]):
+        return len(np.unique(blocks.view(np.dtype((np.void, blocks.itemsize * blocks.shape[1])))))
+    return int(np.count_nonzero(new_group))
+
+def text_features_python(texts):
+    """逐字符计算特征的参考实现（用于基准测试和结果校验）"""
+    rows = []
+    for text in texts:
         # 创建特征向量：行数、平均行长、特殊字符比例、重复内容比例
         lines = text.split('\n')
         num_lines = len(lines)
         avg_line_length = sum(len(line) for line in lines) / num_lines
         
         special_chars = sum(1 for char in text if not char.isalnum() and not char.isspace())
-        special_ratio = special_chars / len(text)
+        special_ratio = special_chars / max(len(text), 1)
         
         # 检测重复内容
-        chunks = [text[i:i+50] for i in range(0, len(text), 50)]
-        unique_chunks = len(set(chunks))
-        repetition_ratio = 1 - (unique_chunks / len(chunks))
+        chunks = [text[i:i+ANOMALY_CHUNK_SIZE] for i in range(0, len(text), ANOMALY_CHUNK_SIZE)]
+        repetition_ratio = 1 - (len(set(chunks)) / len(chunks)) if chunks else 0.0
         
-        # 特征向量
-        X = np.array([[num_lines, avg_line_length, special_ratio, repetition_ratio]])
-        
-        # 创建模型
-        clf = IsolationForest(contamination=0.1, random_state=42)
-        clf.fit(X)
+        rows.append([num_lines, avg_line_length, special_ratio, repetition_ratio])
+    return np.array(rows, dtype=np.float64).reshape(-1, len(ANOMALY_FEATURES))
+
+def text_features(texts):
+    """计算一批文本的特征矩阵，每行依次为ANOMALY_FEATURES
+    
+    所有文本拼接后编码为UTF-32，用np.frombuffer得到码点数组，一次性查表标记特殊字符后按文档切片计数；
+    行统计只需换行符个数；重复内容按50字符分块后对整块去重（分批哈希，大文本的中间数组也留在缓存中）。结果与text_features_python一致。
+    """
+    texts = list(texts)
+    features = np.zeros((len(texts), len(ANOMALY_FEATURES)))
+    if not texts:
+        return features
+    
+    codes = np.frombuffer(''.join(texts).encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+    
+    special = special_char_table(int(codes.max()) if len(codes) else 0).take(codes)
+    
+    start = 0
+    for i, text in enumerate(texts):
+        length = len(text)
+        end = start + length
+        # 含辅助平面字符的str按4字节存储，str.count比在码点数组上计数慢
+        num_lines = int(np.count_nonzero(codes[start:end] == 10)) + 1
+        features[i, 0] = num_lines
+        # 各行长度之和 = 总长度 - 换行符个数
+        features[i, 1] = (length - (num_lines - 1)) / num_lines
+        features[i, 2] = np.count_nonzero(special[start:end]) / max(length, 1)
+        
+        # 整块去重：把每个50字符的块视为一个定长字节串；末尾不足50字符的块长度不同，必然唯一
+        if length:
+            full_chunks = length // ANOMALY_CHUNK_SIZE
+            num_chunks = -(-length // ANOMALY_CHUNK_SIZE)
+            unique_chunks = num_chunks - full_chunks
+            if full_chunks:
+                blocks = codes[start:start + full_chunks * ANOMALY_CHUNK_SIZE].reshape(full_chunks, ANOMALY_CHUNK_SIZE)
+                unique_chunks += count_unique_blocks(np.ascontiguousarray(blocks))
+            features[i, 3] = 1 - unique_chunks / num_chunks
+        start = end
+    return features
+
+def benchmark_text_features(texts=None, rounds=3):
+    """比较向量化特征提取与逐字符参考实现的耗时，并校验结果一致
+    
+    未提供texts时生成不同大小（含约1MB）的测试文本。返回 {文本大小: (参考毫秒数, 向量化毫秒数)}
+    """
+    if texts is None:
+        rng = random.Random(42)
+        words = ['网页', '内容', 'crawler', '数据', 'text', '分析', '——', '系统', '！', '2024', '“引用”', '😀']
+        texts = []
+        for size in (10 * 1024, 100 * 1024, 1024 * 1024):
+            parts, length = [], 0
+            while length < size:
+                line = ' '.join(rng.choice(words) for _ in range(rng.randint(3, 30)))
+                parts.append(line)
+                length += len(line) + 1
+                if rng.random() < 0.05:
+                    # 混入重复段落
+                    parts.extend(parts[-10:])
+                    length += sum(len(p) + 1 for p in parts[-10:])
+            texts.append('\n'.join(parts))
+    
+    # 查找表只在进程内生成一次，预热后再计时
+    text_features(texts)
+    results = {}
+    for text in texts:
+        timings = []
+        for extract in (text_features_python, text_features):
+            start_time = time.perf_counter()
+            for _ in range(rounds):
+                found = extract([text])
+            timings.append((time.perf_counter() - start_time) / rounds * 1000)
+            if extract is text_features_python:
+                expected = found
+        if not np.allclose(found, expected):
+            logging.warning("向量化特征提取的结果与参考实现不一致")
+            print("警告: 向量化特征提取的结果与参考实现不一致")
+        results[len(text)] = tuple(timings)
+    
+    # 边界情况：周期性重复（整块完全相同）、空文本、不足一块、辅助平面字符
+    edge_cases = ['abc' * 100, 'ab' * 25 * 7 + 'c' * 150, '', 'a', 'x\n' * 300, '#$%' * 100, 'é😀\u3000 \n' * 70]
+    if not np.allclose(text_features(edge_cases), text_features_python(edge_cases)):
+        logging.warning("向量化特征提取在边界情况下的结果与参考实现不一致")
+        print("警告: 向量化特征提取在边界情况下的结果与参考实现不一致")
+    
+    # 多文档批量计算
+    start_time = time.perf_counter()
+    text_features(texts)
+    batch_ms = (time.perf_counter() - start_time) * 1000
+    
+    print(f"每种实现运行 {rounds} 次取平均")
+    for size, (reference_ms, vectorized_ms) in results.items():
+        print(f"{size / 1024:>8.0f}K字符  参考 {reference_ms:>9.1f} ms  向量化 {vectorized_ms:>7.1f} ms  "
+              f"(x{reference_ms / vectorized_ms:.1f})")
+    print(f"{len(texts)} 个文本批量计算: {batch_ms:.1f} ms")
+    return results
+
+class ModelUnpickler(pickle.Unpickler):
+    """只允许还原孤立森林模型用到的类，模型文件被替换时不会执行任意代码"""
+    ALLOWED = {
+        ('numpy', 'dtype'),
+        ('numpy', 'ndarray'),
+        ('numpy.core.multiarray', '_reconstruct'),
+        ('numpy.core.multiarray', 'scalar'),
+        ('numpy._core.multiarray', '_reconstruct'),
+        ('numpy._core.multiarray', 'scalar'),
+        ('sklearn.ensemble._iforest', 'IsolationForest'),
+        ('sklearn.tree._classes', 'ExtraTreeRegressor'),
+        ('sklearn.tree._tree', 'Tree'),
+    }
+    
+    def find_class(self, module, name):
+        if (module, name) not in self.ALLOWED:
+            raise pickle.UnpicklingError(f"模型文件包含不允许的类型: {module}.{name}")
+        return super().find_class(module, name)
+
+class AnomalyDetector:
+    """基于预训练孤立森林的内容异常检测
+    
+    模型用已知正常的抓取文本离线训练一次并保存到anomaly_model_file，
+    每个进程首次使用时加载，之后按批量打分。没有模型文件时不判定任何异常，设置界面会显示模型状态。
+    分数越高越异常，超过阈值（anomaly_threshold，为0时用训练得到的阈值）视为异常。
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._model = None
+        self._loaded_path = None
+        self._status = "未加载"
+    
+    def load(self):
+        """加载模型（每个进程只加载一次，模型文件设置变化时重新加载），返回模型或None"""
+        path = CRAWL_SETTINGS['anomaly_model_file']
+        if self._loaded_path == path:
+            return self._model
+        with self._lock:
+            if self._loaded_path != path:
+                self._model = None
+                try:
+                    with open(path, 'rb') as f:
+                        model = ModelUnpickler(f).load()
+                    if (not isinstance(model, dict) or not isinstance(model.get('forest'), IsolationForest)
+                            or tuple(model.get('features', ())) != ANOMALY_FEATURES):
+                        raise ValueError("不是本程序训练的异常检测模型")
+                    self._model = model
+                    self._status = f"已加载 ({model['samples']} 个训练样本)"
+                    logging.info(f"已加载异常检测模型: {path} ({model['samples']} 个训练样本)")
+                except FileNotFoundError:
+                    self._status = f"未找到模型 {path}，检测不生效"
+                    logging.warning(f"未找到异常检测模型 {path}，跳过异常检测（先用--train-anomaly训练）")
+                except Exception as e:
+                    self._status = f"模型无效，检测不生效: {str(e)}"
+                    logging.warning(f"加载异常检测模型失败: {str(e)}")
+                self._loaded_path = path
+            return self._model
+    
+    def status(self):
+        """模型状态说明（显示在设置界面）"""
+        self.load()
+        return self._status
+    
+    def threshold(self):
+        model = self.load()
+        if CRAWL_SETTINGS['anomaly_threshold'] > 0:
+            return CRAWL_SETTINGS['anomaly_threshold']
+        return model['threshold'] if model else float('inf')
+    
+    def score_batch(self, texts):
+        """批量计算异常分数（越高越异常），过短的文本或没有模型时分数为0"""
+        texts = list(texts)
+        scores = np.zeros(len(texts))
+        model = self.load()
+        if model is None:
+            return scores
+        
+        index = [i for i, text in enumerate(texts) if len(text) >= ANOMALY_MIN_LENGTH]
+        if index:
+            X = text_features([texts[i] for i in index])
+            scores[index] = -model['forest'].score_samples(X)
+        return scores
+    
+    def detect_batch(self, texts):
+        """批量判断文本是否异常，返回布尔数组"""
+        return self.score_batch(texts) > self.threshold()
+    
+    def train(self, texts, path=None):
+        """用正常文本训练模型并保存，返回模型信息"""
+        texts = [text for text in texts if len(text) >= ANOMALY_MIN_LENGTH]
+        if not texts:
+            raise ValueError("没有可用于训练的文本")
+        
+        X = text_features(texts)
+        forest = IsolationForest(n_estimators=200, contamination='auto', random_state=42)
+        forest.fit(X)
+        scores = -forest.score_samples(X)
+        model = {
+            'forest': forest,
+            'features': ANOMALY_FEATURES,
+            'threshold': float(np.quantile(scores, 1 - CRAWL_SETTINGS['anomaly_contamination'])),
+            'samples': len(texts),
+            'trained': time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
         
-        # 预测异常
-        return clf.predict(X)[0] == -1
+        path = path or CRAWL_SETTINGS['anomaly_model_file']
+        tmp_file = path + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(model, f)
+        os.replace(tmp_file, path)
+        
+        with self._lock:
+            self._model = model
+            self._loaded_path = path
+            self._status = f"已加载 ({model['samples']} 个训练样本)"
+        return model
+
+ANOMALY_DETECTOR = AnomalyDetector()
+
+def load_training_corpus(path):
+    """读取训练语料：目录下的.txt文件，或工作者输出的JSON Lines（取无错误页面的text字段）"""
+    texts = []
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            if name.endswith('.txt'):
+                with open(os.path.join(path, name), 'r', encoding='utf-8', errors='replace') as f:
+                    texts.append(f.read())
+        return texts
+    
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        if path.endswith('.jsonl'):
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get('text') and not record.get('error'):
+                    texts.append(record['text'])
+        else:
+            texts.append(f.read())
+    return texts
+
+def detect_anomaly(text):
+    """使用预训练的孤立森林检测异常内容"""
+    try:
+        return bool(ANOMALY_DETECTOR.detect_batch([text])[0])
     except Exception as e:
         logging.warning(f"异常检测失败: {str(e)}")
         return False
@@ -737,25 +3841,18 @@ def download_image(url, base_url, index=None, total=None):
         filepath = os.path.join(image_dir, filename)
         
         headers = {
-            'User-Agent': get_random_ua(),
+            'User-Agent': get_random_ua(urlparse.urlparse(base_url).netloc),
             'Referer': base_url,
         }
         
-        proxies = None
-        if CRAWL_SETTINGS['use_proxy']:
-            proxy = get_current_proxy()
-            if proxy:
-                proxies = {
-                    'http': proxy,
-                    'https': proxy,
-                }
+        proxy = get_current_proxy() if CRAWL_SETTINGS['use_proxy'] else None
+        session = requests_retry_session(proxy)
         
         # 直接下载图片（移除了额外的大小检查请求）
-        with requests.get(
+        with session.get(
             url, 
             headers=headers, 
             timeout=(10, 30), 
-            proxies=proxies,
             stream=True
         ) as response:
             if response.status_code != 200:
@@ -780,6 +3877,42 @@ def download_image(url, base_url, index=None, total=None):
         logging.error(f"图片下载失败: {str(e)}")
         return None, f"图片下载失败: {str(e)}"
 
+def download_images(urls, base_url, max_workers=None):
+    """并发下载多张图片，按完成顺序逐个产出 (序号, URL, 文件路径, 错误信息)
+    
+    同时在途的任务数限制为线程数的2倍，避免一次性提交上千个任务
+    """
+    if max_workers is None:
+        max_workers = CRAWL_SETTINGS['image_download_threads']
+    max_workers = max(1, min(max_workers, len(urls) or 1))
+    pending = iter(enumerate(urls, 1))
+    
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running = {}
+        
+        def submit_next():
+            try:
+                i, url = next(pending)
+            except StopIteration:
+                return False
+            running[executor.submit(download_image, url, base_url)] = (i, url)
+            return True
+        
+        for _ in range(max_workers * 2):
+            if not submit_next():
+                break
+        
+        while running:
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                i, url = running.pop(future)
+                try:
+                    filepath, error = future.result()
+                except Exception as e:
+                    filepath, error = None, f"图片下载失败: {str(e)}"
+                submit_next()
+                yield i, url, filepath, error
+
 def save_to_file(content, base_url, file_type="text"):
     domain = re.sub(r'[^\w\-]', '_', urlparse.urlparse(base_url).netloc.replace('www.', ''))
     timestamp = time.strftime("%Y%m%d_%H%M%S")
@@ -803,6 +3936,187 @@ def save_to_file(content, base_url, file_type="text"):
     except Exception as e:
         return None, f"保存失败: {str(e)}"
 
+def load_settings_file(path='crawler_config.json'):
+    """从配置文件合并设置，保留未出现在文件中的默认设置"""
+    try:
+        with open(path, 'r') as f:
+            CRAWL_SETTINGS.update(json.load(f))
+        return True
+    except Exception:
+        return False
+
+class DistributedWorker:
+    """无界面分布式工作者
+    
+    从Redis队列批量取URL交给concurrency个抓取线程，发现的链接批量推回队列，
+    每页结果以JSON Lines写入output。可靠队列模式下抓取成功或遇到终止错误（如404）才确认，
+    其余失败的URL租约到期后重新分发，超过queue_max_deliveries次后移入死信流。
+    """
+    # 队列立即返回空结果时（不阻塞或Redis不可用）两次取URL的最小间隔（秒）
+    IDLE_POLL_INTERVAL = 0.5
+    
+    def __init__(self, concurrency=None, output='worker_results.jsonl', follow_links=True,
+                 max_pages=0, idle_exit=0):
+        self.concurrency = concurrency or CRAWL_SETTINGS['max_threads']
+        self.output = output
+        self.follow_links = follow_links
+        self.max_pages = max_pages
+        self.idle_exit = idle_exit
+        self.stop_event = threading.Event()
+        self.stats = {'pages': 0, 'errors': 0, 'skipped': 0, 'links': 0}
+        self._lock = threading.Lock()
+    
+    def stop(self, *args):
+        """停止取新URL，已在抓取中的URL处理完后退出（可直接用作信号处理函数）"""
+        if not self.stop_event.is_set():
+            logging.warning("收到停止信号，等待进行中的任务完成...")
+        self.stop_event.set()
+    
+    def _count(self, key, n=1):
+        with self._lock:
+            self.stats[key] += n
+    
+    def process(self, url, out):
+        if CRAWL_SETTINGS['obey_robots'] and not get_robots_permission(url):
+            self._count('skipped')
+            ack_urls([url])
+            return
+        
+        links = []
+        text, images, error = fetch_web_content(url, links)
+        if error == "URL已爬取":
+            self._count('skipped')
+            ack_urls([url])
+            return
+        
+        record = {
+            'url': url,
+            'text': text,
+            'images': images,
+            'links': links,
+            'error': error,
+            'time': time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        with self._lock:
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+        
+        if error:
+            self._count('errors')
+            logging.error(f"抓取失败 {url}: {error}")
+            if is_terminal_error(error):
+                ack_urls([url])
+            else:
+                release_urls([url])
+            return
+        
+        self._count('pages')
+        if self.follow_links and links:
+            self._count('links', add_urls_to_queue(urlparse.urldefrag(link)[0] for link in links))
+        # 结果写入、链接入队之后再确认
+        ack_urls([url])
+    
+    def run(self):
+        """运行直到收到停止信号、达到max_pages或空闲超过idle_exit秒，返回统计信息"""
+        start_time = time.time()
+        idle_since = time.time()
+        in_flight = set()
+        popped = 0
+        
+        logging.info(f"工作者 {REDIS_FRONTIER.consumer} 启动，并发 {self.concurrency}")
+        with open(self.output, 'a', encoding='utf-8') as out, \
+                concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while not self.stop_event.is_set():
+                done = {f for f in in_flight if f.done()}
+                for future in done:
+                    try:
+                        future.result()
+                    except Exception as e:
+                        self._count('errors')
+                        logging.error(f"工作者任务异常: {str(e)}")
+                in_flight -= done
+                
+                if self.max_pages and popped >= self.max_pages:
+                    if not in_flight:
+                        break
+                    time.sleep(0.1)
+                    continue
+                
+                free = self.concurrency - len(in_flight)
+                if self.max_pages:
+                    free = min(free, self.max_pages - popped)
+                if free <= 0:
+                    concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                    continue
+                
+                # 有任务在跑时不阻塞，队列空且空闲时阻塞等待新URL
+                poll_start = time.time()
+                urls = get_urls_from_queue(free, block=0 if in_flight else None)
+                if not urls:
+                    if not in_flight:
+                        if self.idle_exit and time.time() - idle_since >= self.idle_exit:
+                            logging.info("队列空闲超时，工作者退出")
+                            break
+                        self.stop_event.wait(max(0.0, self.IDLE_POLL_INTERVAL - (time.time() - poll_start)))
+                    else:
+                        concurrent.futures.wait(in_flight, timeout=0.5, return_when=concurrent.futures.FIRST_COMPLETED)
+                    continue
+                
+                idle_since = time.time()
+                popped += len(urls)
+                for url in urls:
+                    in_flight.add(executor.submit(self.process, url, out))
+            
+            concurrent.futures.wait(in_flight)
+        
+        REDIS_FRONTIER.flush()
+        self.stats['elapsed'] = time.time() - start_time
+        logging.info(
+            f"工作者退出: 成功 {self.stats['pages']} 页, 失败 {self.stats['errors']}, "
+            f"跳过 {self.stats['skipped']}, 入队链接 {self.stats['links']}, 耗时 {self.stats['elapsed']:.1f}秒"
+        )
+        return self.stats
+
+def run_worker(args):
+    """命令行工作者入口：配置文件 + 命令行参数覆盖"""
+    load_settings_file(args.config)
+    CRAWL_SETTINGS['use_distributed'] = True
+    for key in ('redis_host', 'redis_port', 'redis_db', 'redis_password'):
+        value = getattr(args, key)
+        if value is not None:
+            CRAWL_SETTINGS[key] = value
+    if args.reliable_queue:
+        CRAWL_SETTINGS['reliable_queue'] = True
+    if args.parse_processes is not None:
+        CRAWL_SETTINGS['parse_processes'] = args.parse_processes
+    
+    # 日志同时输出到终端
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    logging.getLogger().addHandler(console)
+    
+    try:
+        get_redis_connection().ping()
+    except Exception as e:
+        logging.error(f"Redis连接失败: {str(e)}")
+        return 1
+    
+    if args.seed:
+        seeds = [url for url in map(validate_url, args.seed) if url]
+        logging.info(f"已添加 {add_urls_to_queue(seeds)} 个种子URL到队列")
+    
+    worker = DistributedWorker(
+        concurrency=args.concurrency,
+        output=args.output,
+        follow_links=not args.no_follow,
+        max_pages=args.max_pages,
+        idle_exit=args.idle_exit,
+    )
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run()
+    return 0
+
 class CrawlerGUI:
     def __init__(self, root):
         self.root = root
@@ -815,9 +4129,11 @@ class CrawlerGUI:
         self.web_content = None
         self.image_resources = []
         self.found_links = []
+        self.leased_url = None  # 从可靠队列取出、尚未确认的URL
         self.is_crawling = False
         self.downloading_images = False
         self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=CRAWL_SETTINGS['max_threads'])
+        self.executor_size = CRAWL_SETTINGS['max_threads']
 
         # 添加窗口置顶变量
         self.topmost_var = tk.BooleanVar(value=False)
@@ -826,13 +4142,7 @@ class CrawlerGUI:
         self.create_widgets()
         
         # 尝试加载配置
-        try:
-            with open('crawler_config.json', 'r') as f:
-                loaded_settings = json.load(f)
-                # 合并设置，保留未加载的默认设置
-                CRAWL_SETTINGS.update(loaded_settings)
-        except:
-            pass
+        load_settings_file()
             
         # 添加右下角署名
         self.create_signature()
@@ -1013,8 +4323,10 @@ class CrawlerGUI:
             messagebox.showwarning("警告", "请先启用分布式模式")
             return
             
-        url = get_url_from_queue()
+        # 在界面线程中取URL，不阻塞等待
+        url = get_url_from_queue(block=0)
         if url:
+            self.leased_url = url
             self.url_var.set(url)
             self.log_message(f"从队列获取URL: {url}")
             self.start_crawling()
@@ -1055,15 +4367,87 @@ class CrawlerGUI:
         # 在子线程中执行爬取操作
         threading.Thread(target=self.crawl_thread, daemon=True).start()
     
+    def get_executor(self):
+        """获取爬取线程池，线程数设置变化时重建"""
+        if self.executor_size != CRAWL_SETTINGS['max_threads']:
+            self.executor.shutdown(wait=False)
+            self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=CRAWL_SETTINGS['max_threads'])
+            self.executor_size = CRAWL_SETTINGS['max_threads']
+        return self.executor
+    
+    def crawl_progress(self, page, stats):
+        """整站爬取进度回调"""
+        if page['error']:
+            self.log_message(f"[深度{page['depth']}] 抓取失败: {page['url']} - {page['error']}")
+        else:
+            self.log_message(f"[深度{page['depth']}] 抓取成功: {page['url']}")
+        self.status_var.set(
+            f"已抓取 {stats['pages']} 页 / 已发现 {stats['queued']} 个 | {stats['pages_per_sec']:.2f} 页/秒"
+        )
+        self.progress_var.set(stats['pages'] / stats['queued'] * 100 if stats['queued'] else 0)
+    
     def crawl_thread(self):
-        self.web_content, self.image_resources, error = fetch_web_content(self.current_url)
+        try:
+            self.run_crawl()
+        except Exception as e:
+            logging.error(f"爬取线程异常: {str(e)}")
+            self.log_message(f"抓取出错: {str(e)}")
+            self.status_var.set(f"抓取出错: {str(e)}")
+            # 出错的URL不确认，租约超时后重新分发
+            if self.leased_url:
+                release_urls([self.leased_url])
+                self.leased_url = None
+        finally:
+            # 无论成功与否都恢复界面状态，否则之后无法再开始抓取
+            self.progress_var.set(0)
+            self.is_crawling = False
+    
+    def run_crawl(self):
+        max_depth = CRAWL_SETTINGS['max_depth']
+        if max_depth > 0:
+            self.log_message(f"整站爬取: 深度 {max_depth}, 线程数 {CRAWL_SETTINGS['max_threads']}")
+        
+        results, stats = crawl_site(
+            self.current_url,
+            max_depth=max_depth,
+            max_threads=CRAWL_SETTINGS['max_threads'],
+            max_pages=CRAWL_SETTINGS['max_pages'],
+            executor=self.get_executor(),
+            progress_callback=self.crawl_progress if max_depth > 0 else None,
+        )
         
-        if error:
+        # 起始页面决定预览内容
+        first_page = next((r for r in results if r['url'] == self.current_url), None)
+        if first_page is None or first_page['error']:
+            error = first_page['error'] if first_page else "未获取到页面"
             self.log_message(f"抓取失败: {error}")
             self.status_var.set(f"抓取失败: {error}")
-            self.is_crawling = False
+            # 失败的URL不确认，租约超时后重新分发，超过分发次数上限后移入死信流
+            if self.leased_url:
+                release_urls([self.leased_url])
+                self.leased_url = None
             return
         
+        self.web_content = first_page['text']
+        
+        # 汇总所有页面的图片和链接
+        self.image_resources = []
+        seen_images = set()
+        for page in results:
+            for img_url in page['images']:
+                if img_url not in seen_images:
+                    seen_images.add(img_url)
+                    self.image_resources.append(img_url)
+        
+        self.found_links = []
+        if max_depth > 0:
+            seen_links = {self.current_url}
+            for page in results:
+                for link in [page['url']] + page['links']:
+                    if link not in seen_links:
+                        seen_links.add(link)
+                        self.found_links.append(link)
+        
         # 更新文本预览
         self.text_preview.config(state=tk.NORMAL)
         self.text_preview.delete(1.0, tk.END)
@@ -1076,36 +4460,12 @@ class CrawlerGUI:
             display_url = img_url[:80] + "..." if len(img_url) > 80 else img_url
             self.image_listbox.insert(tk.END, display_url)
         
-        # 链接挖掘
-        if CRAWL_SETTINGS['max_depth'] > 0:
-            self.log_message("正在挖掘页面链接...")
-            try:
-                if not self.web_content:
-                    session = requests_retry_session()
-                    headers = {'User-Agent': get_random_ua()}
-                    proxies = None
-                    if CRAWL_SETTINGS['use_proxy'] and CRAWL_SETTINGS['proxy_list']:
-                        proxy = get_current_proxy()
-                        if proxy:
-                            proxies = {
-                                'http': proxy,
-                                'https': proxy,
-                            }
-                    response = session.get(
-                        self.current_url, 
-                        headers=headers, 
-                        proxies=proxies,
-                        verify=not CRAWL_SETTINGS['ignore_ssl']
-                    )
-                    content = response.text
-                else:
-                    content = self.web_content
-                
-                soup = BeautifulSoup(content, 'lxml')
-                self.found_links = extract_links(soup, self.current_url, CRAWL_SETTINGS['max_depth'])
-                self.log_message(f"发现 {len(self.found_links)} 个链接")
-            except Exception as e:
-                self.log_message(f"链接挖掘失败: {str(e)}")
+        if max_depth > 0:
+            self.log_message(
+                f"整站爬取完成: {stats['pages']} 页 (失败 {stats['errors']}), "
+                f"耗时 {stats['elapsed']:.1f}秒, {stats['pages_per_sec']:.2f} 页/秒"
+            )
+            self.log_message(f"发现 {len(self.found_links)} 个链接")
         
         self.log_message(f"抓取成功！文本长度: {len(self.web_content)}字符")
         if self.image_resources:
@@ -1113,12 +4473,17 @@ class CrawlerGUI:
         
         # 如果是分布式模式，添加发现的链接到队列
         if CRAWL_SETTINGS['use_distributed'] and self.found_links:
-            for link in self.found_links:
-                add_url_to_queue(link)
-            self.log_message(f"已添加 {len(self.found_links)} 个链接到分布式队列")
+            added = add_urls_to_queue(self.found_links)
+            self.log_message(f"已添加 {added} 个链接到分布式队列")
+        
+        # 发现的链接入队后再确认；只确认本次抓取的URL对应的租约
+        if self.leased_url == self.current_url:
+            ack_urls([self.leased_url])
+        elif self.leased_url:
+            release_urls([self.leased_url])
+        self.leased_url = None
         
         self.status_var.set(f"抓取完成: {self.current_url}")
-        self.is_crawling = False
     
     def download_selected_image(self):
         if not self.image_resources:
@@ -1179,10 +4544,11 @@ class CrawlerGUI:
         total = len(self.image_resources)
         update_count = 0  # 用于计数
         update_interval = max(10, total//10)  # 每10张或10%更新一次
+        self.log_message(f"并发下载线程数: {CRAWL_SETTINGS['image_download_threads']}")
         
-        for i, img_url in enumerate(self.image_resources, 1):
-            filepath, error = download_image(img_url, self.current_url, i, total)
-            
+        # 按完成顺序处理结果
+        for done, (i, img_url, filepath, error) in enumerate(
+                download_images(self.image_resources, self.current_url), 1):
             # 记录结果
             if error:
                 if "图片过大" in error:
@@ -1197,9 +4563,10 @@ class CrawlerGUI:
             
             # 更新进度（每10张或最后一张才更新界面）
             update_count += 1
-            if update_count >= update_interval or i == total:
-                progress = (i / total) * 100
+            if update_count >= update_interval or done == total:
+                progress = (done / total) * 100
                 self.progress_var.set(progress)
+                self.status_var.set(f"正在下载图片... {done}/{total}")
                 self.root.update_idletasks()
                 update_count = 0  # 重置计数器
         
@@ -1330,6 +4697,12 @@ class AdvancedSettingsWindow:
         self.use_proxy_var = tk.BooleanVar(value=CRAWL_SETTINGS['use_proxy'])
         ttk.Checkbutton(settings_frame, text="使用代理", variable=self.use_proxy_var).grid(row=1, column=0, sticky="w", padx=5, pady=5)
         
+        probe_frame = ttk.Frame(settings_frame)
+        probe_frame.grid(row=1, column=1, sticky="we", padx=5, pady=5)
+        ttk.Label(probe_frame, text="检测地址:").pack(side=tk.LEFT)
+        self.proxy_probe_url_var = tk.StringVar(value=CRAWL_SETTINGS['proxy_probe_url'])
+        ttk.Entry(probe_frame, textvariable=self.proxy_probe_url_var, width=22).pack(side=tk.LEFT, fill=tk.X, expand=True)
+        
         ttk.Label(settings_frame, text="代理列表 (每行一个):").grid(row=2, column=0, sticky="w", padx=5, pady=5)
         
         self.proxy_text = scrolledtext.ScrolledText(settings_frame, height=3, width=40)
@@ -1410,6 +4783,8 @@ class AdvancedSettingsWindow:
         # 17. 使用Bloom Filter
         self.bloom_filter_var = tk.BooleanVar(value=CRAWL_SETTINGS['use_bloom_filter'])
         ttk.Checkbutton(settings_frame, text="使用Bloom Filter去重", variable=self.bloom_filter_var).grid(row=20, column=0, sticky="w", padx=5, pady=5)
+        self.reliable_queue_var = tk.BooleanVar(value=CRAWL_SETTINGS['reliable_queue'])
+        ttk.Checkbutton(settings_frame, text="可靠队列(租约/确认)", variable=self.reliable_queue_var).grid(row=20, column=1, sticky="w", padx=5, pady=5)
         
         # 高级功能
         ttk.Label(settings_frame, text="--- 高级功能 ---").grid(row=21, column=0, columnspan=2, pady=10, sticky="ew")
@@ -1428,7 +4803,33 @@ class AdvancedSettingsWindow:
         
         # 21. 异常检测
         self.anomaly_detection_var = tk.BooleanVar(value=CRAWL_SETTINGS['anomaly_detection'])
-        ttk.Checkbutton(settings_frame, text="内容异常检测", variable=self.anomaly_detection_var).grid(row=25, column=0, sticky="w", padx=5, pady=5)
+        ttk.Checkbutton(settings_frame, text="内容异常检测", variable=self.anomaly_detection_var,
+                        command=self.update_anomaly_status).grid(row=25, column=0, sticky="w", padx=5, pady=5)
+        self.anomaly_status_var = tk.StringVar()
+        ttk.Label(settings_frame, textvariable=self.anomaly_status_var, wraplength=220).grid(row=25, column=1, sticky="w", padx=5, pady=5)
+        self.update_anomaly_status()
+        
+        # 22. asyncio抓取
+        self.async_fetch_var = tk.BooleanVar(value=CRAWL_SETTINGS['async_fetch'])
+        ttk.Checkbutton(settings_frame, text="asyncio高并发抓取", variable=self.async_fetch_var).grid(row=26, column=0, sticky="w", padx=5, pady=5)
+        self.async_concurrency_var = tk.IntVar(value=CRAWL_SETTINGS['async_concurrency'])
+        ttk.Spinbox(settings_frame, from_=1, to=5000, width=5, textvariable=self.async_concurrency_var).grid(row=26, column=1, sticky="w", padx=5, pady=5)
+        
+        # 23. 快速渲染
+        self.fast_render_var = tk.BooleanVar(value=CRAWL_SETTINGS['fast_render'])
+        ttk.Checkbutton(settings_frame, text="快速渲染(拦截图片/字体/广告)", variable=self.fast_render_var).grid(row=27, column=0, sticky="w", padx=5, pady=5)
+        
+        # 24. 解析进程数
+        ttk.Label(settings_frame, text="解析进程数(0为不启用):").grid(row=28, column=0, sticky="w", padx=5, pady=5)
+        self.parse_processes_var = tk.IntVar(value=CRAWL_SETTINGS['parse_processes'])
+        ttk.Spinbox(settings_frame, from_=0, to=64, width=5, textvariable=self.parse_processes_var).grid(row=28, column=1, sticky="w", padx=5, pady=5)
+        
+        # 25. 按主机限速
+        ttk.Label(settings_frame, text="每主机并发数:").grid(row=29, column=0, sticky="w", padx=5, pady=5)
+        self.host_concurrency_var = tk.IntVar(value=CRAWL_SETTINGS['host_concurrency'])
+        ttk.Spinbox(settings_frame, from_=1, to=64, width=5, textvariable=self.host_concurrency_var).grid(row=29, column=1, sticky="w", padx=5, pady=5)
+        self.adaptive_throttle_var = tk.BooleanVar(value=CRAWL_SETTINGS['adaptive_throttle'])
+        ttk.Checkbutton(settings_frame, text="自适应限速(429/503退避)", variable=self.adaptive_throttle_var).grid(row=30, column=0, sticky="w", padx=5, pady=5)
         
         # 添加分隔线
         ttk.Separator(inner_frame, orient='horizontal').pack(fill='x', pady=10)
@@ -1452,6 +4853,13 @@ class AdvancedSettingsWindow:
         self.parent.update()
         self.parent.geometry("500x600")  # 固定窗口大小
     
+    def update_anomaly_status(self):
+        """显示异常检测是否实际生效（没有模型时勾选也不生效）"""
+        if not self.anomaly_detection_var.get():
+            self.anomaly_status_var.set("未启用")
+        else:
+            self.anomaly_status_var.set(f"模型: {ANOMALY_DETECTOR.status()}")
+    
     def save_settings(self):
         try:
             # 更新全局设置
@@ -1463,6 +4871,7 @@ class AdvancedSettingsWindow:
             proxy_list = [p.strip() for p in proxy_text.split('\n') if p.strip()]
             CRAWL_SETTINGS['proxy_list'] = proxy_list
             CRAWL_SETTINGS['current_proxy_index'] = 0
+            CRAWL_SETTINGS['proxy_probe_url'] = self.proxy_probe_url_var.get().strip() or CRAWL_SETTINGS['proxy_probe_url']
             
             CRAWL_SETTINGS['ignore_ssl'] = self.ignore_ssl_var.get()
             CRAWL_SETTINGS['dynamic_rendering'] = self.dynamic_rendering_var.get()
@@ -1481,12 +4890,23 @@ class AdvancedSettingsWindow:
             CRAWL_SETTINGS['redis_port'] = self.redis_port_var.get()
             CRAWL_SETTINGS['redis_password'] = self.redis_password_var.get()
             CRAWL_SETTINGS['use_bloom_filter'] = self.bloom_filter_var.get()
+            CRAWL_SETTINGS['reliable_queue'] = self.reliable_queue_var.get()
             
             # 高级功能
             CRAWL_SETTINGS['behavior_simulation'] = self.behavior_sim_var.get()
             CRAWL_SETTINGS['tls_fingerprint'] = self.tls_fingerprint_var.get()
             CRAWL_SETTINGS['ai_content_extraction'] = self.ai_extraction_var.get()
             CRAWL_SETTINGS['anomaly_detection'] = self.anomaly_detection_var.get()
+            CRAWL_SETTINGS['async_fetch'] = self.async_fetch_var.get()
+            CRAWL_SETTINGS['async_concurrency'] = self.async_concurrency_var.get()
+            CRAWL_SETTINGS['fast_render'] = self.fast_render_var.get()
+            CRAWL_SETTINGS['parse_processes'] = self.parse_processes_var.get()
+            CRAWL_SETTINGS['host_concurrency'] = self.host_concurrency_var.get()
+            CRAWL_SETTINGS['adaptive_throttle'] = self.adaptive_throttle_var.get()
+            self.update_anomaly_status()
+            
+            # 代理等设置可能已变化，丢弃旧的长连接会话
+            SESSION_POOL.clear()
             
             self.log_callback("设置已保存")
             messagebox.showinfo("成功", "设置已成功保存")
@@ -1501,22 +4921,72 @@ class AdvancedSettingsWindow:
             messagebox.showinfo("测试结果", "没有可测试的代理")
             return
         
+        probe_url = self.proxy_probe_url_var.get().strip() or CRAWL_SETTINGS['proxy_probe_url']
+        
+        # 结果窗口：后台线程并发检测，结果经队列逐条显示，不阻塞界面
+        window = tk.Toplevel(self.parent)
+        window.title("代理测试")
+        window.geometry("560x400")
+        status_var = tk.StringVar(value=f"正在检测 {len(proxy_list)} 个代理...")
+        ttk.Label(window, textvariable=status_var).pack(fill=tk.X, padx=10, pady=5)
+        
+        columns = ("proxy", "status", "latency", "anonymity")
+        tree = ttk.Treeview(window, columns=columns, show="headings")
+        for column, title, width in zip(columns, ("代理", "状态", "延迟", "匿名度"), (260, 80, 80, 100)):
+            tree.heading(column, text=title)
+            tree.column(column, width=width)
+        tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        
+        results = queue.Queue()
+        stop_event = threading.Event()
         working_proxies = []
-        failed_proxies = []
         
-        for proxy in proxy_list:
-            if test_proxy(proxy):
-                working_proxies.append(proxy)
-            else:
-                failed_proxies.append(proxy)
+        def run():
+            try:
+                for result in validate_proxies(proxy_list, probe_url, stop_event=stop_event):
+                    results.put(result)
+            finally:
+                results.put(None)
+        
+        def poll():
+            done = False
+            while True:
+                try:
+                    result = results.get_nowait()
+                except queue.Empty:
+                    break
+                if result is None:
+                    done = True
+                    break
+                if result['ok']:
+                    working_proxies.append(result['proxy'])
+                tree.insert("", tk.END, values=(
+                    result['proxy'],
+                    "可用" if result['ok'] else "不可用",
+                    f"{result['latency'] * 1000:.0f}ms" if result['latency'] is not None else "-",
+                    result['anonymity'] or "-",
+                ))
+            checked = len(tree.get_children())
+            if done:
+                status_var.set(f"检测完成: 可用 {len(working_proxies)} 个, 不可用 {checked - len(working_proxies)} 个")
+                self.log_callback(f"代理测试完成: {len(working_proxies)}/{checked} 可用")
+            elif window.winfo_exists():
+                status_var.set(f"已检测 {checked}/{len(proxy_list)}，可用 {len(working_proxies)} 个")
+                window.after(100, poll)
+        
+        def keep_working():
+            self.proxy_text.delete(1.0, tk.END)
+            self.proxy_text.insert(tk.END, "\n".join(working_proxies))
         
-        result = "代理测试结果:\n\n"
-        result += f"可用代理 ({len(working_proxies)}个):\n"
-        result += "\n".join(working_proxies) + "\n\n"
-        result += f"不可用代理 ({len(failed_proxies)}个):\n"
-        result += "\n".join(failed_proxies)
+        btn_frame = ttk.Frame(window)
+        btn_frame.pack(fill=tk.X, padx=10, pady=5)
+        ttk.Button(btn_frame, text="只保留可用代理", command=keep_working).pack(side=tk.LEFT)
+        ttk.Button(btn_frame, text="关闭", command=window.destroy).pack(side=tk.RIGHT)
+        # 关闭窗口时停止检测
+        window.bind("<Destroy>", lambda event: stop_event.set() if event.widget is window else None)
         
-        messagebox.showinfo("代理测试结果", result)
+        threading.Thread(target=run, daemon=True).start()
+        window.after(100, poll)
     
     def load_default(self):
         default_settings = {
@@ -1528,6 +4998,7 @@ class AdvancedSettingsWindow:
             'dynamic_rendering': False,
             'request_delay': 0.5,
             'max_depth': 1,
+            'max_pages': 0,
             'image_crawling': True,
             'max_threads': 5,
             'image_size_limit': 10,
@@ -1540,10 +5011,70 @@ class AdvancedSettingsWindow:
             'redis_password': '',
             'use_distributed': False,
             'use_bloom_filter': True,
+            'reliable_queue': False,
+            'queue_lease_timeout': 300,
+            'queue_block_timeout': 5,
+            'queue_max_deliveries': 5,
+            'bloom_capacity': 1000000,
+            'bloom_error_rate': 0.001,
+            'bloom_sync_batch': 500,
+            'bloom_sync_interval': 2.0,
             'behavior_simulation': True,
             'tls_fingerprint': True,
             'ai_content_extraction': True,
-            'anomaly_detection': True,
+            'content_selector_failures': 3,
+            'template_learning': True,
+            'template_min_pages': 5,
+            'template_min_confidence': 0.8,
+            'template_file': 'content_templates.json',
+            'anomaly_detection': False,
+            'anomaly_model_file': 'anomaly_model.pkl',
+            'anomaly_threshold': 0.0,
+            'anomaly_contamination': 0.01,
+            'image_download_threads': 20,
+            'async_fetch': False,
+            'async_concurrency': 200,
+            'max_connections_per_host': 10,
+            'session_pool_hosts': 100,
+            'strategy_cache_ttl': 1800,
+            'strategy_failure_threshold': 2,
+            'browser_pool_size': 2,
+            'browser_max_pages': 50,
+            'fast_render': False,
+            'parse_processes': 0,
+            'host_concurrency': 2,
+            'host_burst': 1,
+            'host_overrides': {},
+            'adaptive_throttle': True,
+            'adaptive_fast_response': 0.5,
+            'adaptive_min_factor': 0.5,
+            'proxy_failure_threshold': 3,
+            'proxy_cooldown': 30,
+            'proxy_max_cooldown': 1800,
+            'proxy_pin_per_host': False,
+            'proxy_probe_url': 'http://httpbin.org/ip',
+            'proxy_probe_timeout': 10,
+            'proxy_probe_concurrency': 100,
+            'retry_deadline': 60,
+            'retry_backoff_base': 0.5,
+            'retry_backoff_max': 10,
+            'retry_budget_ratio': 0.2,
+            'retry_budget_min': 5,
+            'render_block_resources': ['image', 'font', 'media', 'stylesheet'],
+            'render_block_domains': [
+                'google-analytics.com', 'googletagmanager.com', 'doubleclick.net',
+                'googlesyndication.com', 'facebook.net', 'hotjar.com', 'hm.baidu.com', 'cnzz.com',
+            ],
+            'render_idle_ms': 500,
+            'render_wait_ms': 3000,
+            'render_time_budget': 10,
+            'parser_backend': 'lxml',
+            'ua_pool_size': 200,
+            'sticky_user_agent': False,
+            'obey_robots': True,
+            'robots_cache_ttl': 86400,
+            'robots_negative_ttl': 3600,
+            'robots_cache_file': 'robots_cache.json',
         }
         
         CRAWL_SETTINGS.update(default_settings)
@@ -1553,6 +5084,7 @@ class AdvancedSettingsWindow:
         self.use_proxy_var.set(CRAWL_SETTINGS['use_proxy'])
         self.proxy_text.delete(1.0, tk.END)
         self.proxy_text.insert(tk.END, "\n".join(CRAWL_SETTINGS['proxy_list']))
+        self.proxy_probe_url_var.set(CRAWL_SETTINGS['proxy_probe_url'])
         self.ignore_ssl_var.set(CRAWL_SETTINGS['ignore_ssl'])
         self.dynamic_rendering_var.set(CRAWL_SETTINGS['dynamic_rendering'])
         self.delay_var.set(CRAWL_SETTINGS['request_delay'])
@@ -1569,10 +5101,18 @@ class AdvancedSettingsWindow:
         self.redis_port_var.set(CRAWL_SETTINGS['redis_port'])
         self.redis_password_var.set(CRAWL_SETTINGS['redis_password'])
         self.bloom_filter_var.set(CRAWL_SETTINGS['use_bloom_filter'])
+        self.reliable_queue_var.set(CRAWL_SETTINGS['reliable_queue'])
         self.behavior_sim_var.set(CRAWL_SETTINGS['behavior_simulation'])
         self.tls_fingerprint_var.set(CRAWL_SETTINGS['tls_fingerprint'])
         self.ai_extraction_var.set(CRAWL_SETTINGS['ai_content_extraction'])
         self.anomaly_detection_var.set(CRAWL_SETTINGS['anomaly_detection'])
+        self.update_anomaly_status()
+        self.async_fetch_var.set(CRAWL_SETTINGS['async_fetch'])
+        self.async_concurrency_var.set(CRAWL_SETTINGS['async_concurrency'])
+        self.fast_render_var.set(CRAWL_SETTINGS['fast_render'])
+        self.parse_processes_var.set(CRAWL_SETTINGS['parse_processes'])
+        self.host_concurrency_var.set(CRAWL_SETTINGS['host_concurrency'])
+        self.adaptive_throttle_var.set(CRAWL_SETTINGS['adaptive_throttle'])
         
         self.log_callback("已加载默认设置")
         messagebox.showinfo("成功", "已加载默认设置")
@@ -1599,6 +5139,7 @@ class AdvancedSettingsWindow:
             self.use_proxy_var.set(CRAWL_SETTINGS['use_proxy'])
             self.proxy_text.delete(1.0, tk.END)
             self.proxy_text.insert(tk.END, "\n".join(CRAWL_SETTINGS['proxy_list']))
+            self.proxy_probe_url_var.set(CRAWL_SETTINGS['proxy_probe_url'])
             self.ignore_ssl_var.set(CRAWL_SETTINGS['ignore_ssl'])
             self.dynamic_rendering_var.set(CRAWL_SETTINGS['dynamic_rendering'])
             self.delay_var.set(CRAWL_SETTINGS['request_delay'])
@@ -1615,10 +5156,18 @@ class AdvancedSettingsWindow:
             self.redis_port_var.set(CRAWL_SETTINGS['redis_port'])
             self.redis_password_var.set(CRAWL_SETTINGS['redis_password'])
             self.bloom_filter_var.set(CRAWL_SETTINGS['use_bloom_filter'])
+            self.reliable_queue_var.set(CRAWL_SETTINGS['reliable_queue'])
             self.behavior_sim_var.set(CRAWL_SETTINGS['behavior_simulation'])
             self.tls_fingerprint_var.set(CRAWL_SETTINGS['tls_fingerprint'])
             self.ai_extraction_var.set(CRAWL_SETTINGS['ai_content_extraction'])
             self.anomaly_detection_var.set(CRAWL_SETTINGS['anomaly_detection'])
+            self.update_anomaly_status()
+            self.async_fetch_var.set(CRAWL_SETTINGS['async_fetch'])
+            self.async_concurrency_var.set(CRAWL_SETTINGS['async_concurrency'])
+            self.fast_render_var.set(CRAWL_SETTINGS['fast_render'])
+            self.parse_processes_var.set(CRAWL_SETTINGS['parse_processes'])
+            self.host_concurrency_var.set(CRAWL_SETTINGS['host_concurrency'])
+            self.adaptive_throttle_var.set(CRAWL_SETTINGS['adaptive_throttle'])
             
             self.log_callback("配置已从文件加载")
             messagebox.showinfo("成功", "配置已成功加载")
@@ -1629,6 +5178,54 @@ class AdvancedSettingsWindow:
 
 # 主程序入口
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="遮罩爬虫系统 v1.8.1（不带参数时启动图形界面）")
+    parser.add_argument('--bench-parsers', nargs='?', const='', metavar='HTML文件',
+                        help="解析后端基准测试（可指定HTML文件）")
+    parser.add_argument('--worker', action='store_true', help="以无界面分布式工作者模式运行")
+    parser.add_argument('--bench-features', action='store_true', help="异常检测特征提取基准测试")
+    parser.add_argument('--train-anomaly', metavar='语料',
+                        help="用正常文本训练异常检测模型（.txt目录、文本文件或工作者输出的.jsonl）")
+    parser.add_argument('--config', default='crawler_config.json', help="配置文件路径")
+    parser.add_argument('--concurrency', type=int, help="每个进程的并发抓取数（默认max_threads）")
+    parser.add_argument('--parse-processes', type=int, help="解析子进程数（默认parse_processes设置）")
+    parser.add_argument('--output', default='worker_results.jsonl', help="结果输出文件（JSON Lines）")
+    parser.add_argument('--max-pages', type=int, default=0, help="处理指定数量URL后退出（0为不限）")
+    parser.add_argument('--idle-exit', type=float, default=0, help="队列空闲指定秒数后退出（0为一直运行）")
+    parser.add_argument('--no-follow', action='store_true', help="不把发现的链接推回队列")
+    parser.add_argument('--seed', nargs='*', metavar='URL', help="启动前推入队列的URL")
+    parser.add_argument('--reliable-queue', action='store_true', help="使用可靠队列（租约/确认）")
+    parser.add_argument('--redis-host', dest='redis_host')
+    parser.add_argument('--redis-port', dest='redis_port', type=int)
+    parser.add_argument('--redis-db', dest='redis_db', type=int)
+    parser.add_argument('--redis-password', dest='redis_password')
+    args = parser.parse_args()
+    
+    # 解析后端基准测试: python 遮罩v1.8.1.py --bench-parsers [HTML文件]
+    if args.bench_parsers is not None:
+        html_text = None
+        if args.bench_parsers:
+            with open(args.bench_parsers, 'r', encoding='utf-8', errors='replace') as f:
+                html_text = f.read()
+        benchmark_parsers(html_text)
+        sys.exit(0)
+    
+    # 特征提取基准测试: python 遮罩v1.8.1.py --bench-features
+    if args.bench_features:
+        benchmark_text_features()
+        sys.exit(0)
+    
+    # 训练异常检测模型: python 遮罩v1.8.1.py --train-anomaly worker_results.jsonl
+    if args.train_anomaly:
+        load_settings_file(args.config)
+        model = ANOMALY_DETECTOR.train(load_training_corpus(args.train_anomaly))
+        print(f"模型已保存到 {CRAWL_SETTINGS['anomaly_model_file']}: "
+              f"{model['samples']} 个样本, 阈值 {model['threshold']:.4f}")
+        sys.exit(0)
+    
+    # 无界面工作者: python 遮罩v1.8.1.py --worker --concurrency 16 --redis-host 10.0.0.5
+    if args.worker:
+        sys.exit(run_worker(args))
+    
     root = tk.Tk()
     app = CrawlerGUI(root)
     root.mainloop()